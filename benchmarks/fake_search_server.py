@@ -0,0 +1,9 @@
+from benchmarks.fakes import FakeTavilyClient
+import src.search_server as search_server
+
+# 基准测试用的 MCP 搜索服务：与 src/search_server.py 完全相同，只是把 Tavily 换成本地桩
+
+search_server.tavily_client = FakeTavilyClient()
+
+if __name__ == "__main__":
+    search_server.mcp.run()
@@ -0,0 +1,125 @@
+import os
+import time
+import hashlib
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# 离线基准测试用的本地替身：脚本化聊天模型、确定性 Embedding、Tavily 桩客户端。
+# 不访问任何网络，结果可在不同提交之间直接对比。
+
+
+def offline_env():
+    """在导入 src.config 之前调用：填充必需的配置项，并关闭会干扰测量的缓存"""
+    os.environ.setdefault("AI_BASE_URL", "http://127.0.0.1:9/v1")
+    os.environ.setdefault("API_KEY", "sk-offline")
+    os.environ.setdefault("TAVILY_API_KEY", "tvly-offline")
+    os.environ["MCP_SERVER_SCRIPT"] = "benchmarks/fake_search_server.py"
+    os.environ["SEARCH_CACHE_ENABLED"] = "false"
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    os.environ["CONTEXT_LOG_TOKENS"] = "false"
+
+
+# 默认脚本：模拟一次"做一个徒步网站"的完整交付
+# 第 1 步查规范 + 搜索，第 2 步一次性写 3 个文件，第 3 步给出最终回复。
+DEFAULT_SCRIPT = [
+    [
+        ("search_local_docs", {"query": "全局变量命名规范"}),
+        ("search_web", {"query": "FastAPI static files example"}),
+    ],
+    [
+        ("write_file", {"file_path": "bench_app/main.py", "content": "dm_secret_trails = []\n" * 200}),
+        ("write_file", {"file_path": "bench_app/static/index.html", "content": "<html></html>\n" * 200}),
+        ("write_file", {"file_path": "bench_app/requirements.txt", "content": "fastapi\nuvicorn\n"}),
+    ],
+    "任务完成：已生成 bench_app/main.py, bench_app/static/index.html, bench_app/requirements.txt",
+]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    按脚本输出的聊天模型。
+    当前轮（最后一条 HumanMessage 之后）已有 n 条 AIMessage 时输出 script[n]：
+    列表表示一组工具调用，字符串表示最终回复。latency 模拟每次调用的网络耗时。
+    """
+
+    script: list = DEFAULT_SCRIPT
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _step(self, messages) -> int:
+        step = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage):
+                step += 1
+        return min(step, len(self.script) - 1)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        action = self.script[self._step(messages)]
+        if isinstance(action, str):
+            message = AIMessage(content=action)
+        else:
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": name, "args": args, "id": f"call_{len(messages)}_{i}"}
+                    for i, (name, args) in enumerate(action)
+                ]
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeEmbeddings(Embeddings):
+    """确定性 Embedding：对字符 bigram 做特征哈希，结果只取决于文本内容"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _embed(self, text: str) -> list[float]:
+        vector = [0.0] * self.dim
+        for i in range(max(len(text) - 1, 1)):
+            digest = hashlib.md5(text[i:i + 2].encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+class FakeTavilyClient:
+    """TavilyClient 的桩实现：按查询内容返回固定格式的结果"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def search(self, query: str, max_results: int = 3, **kwargs) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        return {
+            "results": [
+                {
+                    "title": f"Result {i} for {query}",
+                    "url": f"https://example.com/{hashlib.md5(query.encode('utf-8')).hexdigest()[:8]}/{i}",
+                    "content": f"Offline content #{i} about {query}. " * 5,
+                    "score": 1.0 - i * 0.1,
+                }
+                for i in range(max_results)
+            ]
+        }
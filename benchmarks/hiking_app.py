@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlencode
+from benchmarks.run import PROJECT_ROOT, percentiles
+
+# 生成的示例应用 output/hiking_trails_app 的压测：真实 uvicorn 进程 + 多线程 keep-alive 客户端
+# 用法（在项目根目录，需要安装该应用的 requirements.txt）：
+#   python -m benchmarks.hiking_app --trails 100000 --duration 10 --clients 16
+#
+# 按接口输出吞吐（req/s）与延迟分位数（p50/p95/p99）。另外在进程内对比同一批半径查询下
+# 旧实现（字典列表逐条计算距离）与网格索引 + 向量化 Haversine 的耗时。
+
+APP_DIRECTORY = os.path.join(PROJECT_ROOT, "output", "hiking_trails_app")
+
+
+def _random_point(rng: random.Random):
+    return round(rng.uniform(26.0, 48.0), 4), round(rng.uniform(-122.0, -69.0), 4)
+
+
+def _trails_path(rng):
+    lat, lng = _random_point(rng)
+    return "/api/trails?" + urlencode({
+        "lat": lat, "lng": lng, "max_distance_km": rng.choice([10, 25, 50, 100]), "page_size": 20
+    })
+
+
+def _nearest_path(rng):
+    lat, lng = _random_point(rng)
+    return "/api/trails/nearest?" + urlencode({"lat": lat, "lng": lng, "k": 10})
+
+
+def _detail_path(rng):
+    return f"/api/trails/{rng.randint(1, 1000)}"
+
+
+# (权重, 接口名, 生成请求路径的函数)
+ENDPOINTS = [
+    (6, "GET /api/trails", _trails_path),
+    (2, "GET /api/trails/nearest", _nearest_path),
+    (1, "GET /api/trails/{id}", _detail_path),
+    (1, "GET /api/stats", lambda rng: "/api/stats"),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/api/stats")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"hiking app did not become ready within {timeout:.0f}s")
+
+
+def _client(port: int, deadline: float, seed: int, samples: dict, errors: list):
+    rng = random.Random(seed)
+    weights = [w for w, _, _ in ENDPOINTS]
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    while time.monotonic() < deadline:
+        _, name, make_path = rng.choices(ENDPOINTS, weights=weights)[0]
+        start = time.perf_counter()
+        try:
+            conn.request("GET", make_path(rng))
+            response = conn.getresponse()
+            body = response.read()
+            if response.status != 200 or b'"happiness_level":"max"' not in body:
+                errors.append(f"{name}: HTTP {response.status}")
+        except OSError as e:
+            errors.append(f"{name}: {type(e).__name__}")
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        samples[name].append(time.perf_counter() - start)
+    conn.close()
+
+
+def run_load(n_trails: int, duration: float, clients: int) -> dict:
+    port = _free_port()
+    env = dict(os.environ, DM_SYNTHETIC_TRAILS=str(n_trails))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=APP_DIRECTORY, env=env
+    )
+    try:
+        started = time.perf_counter()
+        _wait_ready(port, timeout=120)
+        startup = time.perf_counter() - started
+
+        samples = {name: [] for _, name, _ in ENDPOINTS}
+        errors = []
+        deadline = time.monotonic() + duration
+        threads = [
+            threading.Thread(target=_client, args=(port, deadline, seed, samples, errors))
+            for seed in range(clients)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    all_samples = [s for values in samples.values() for s in values]
+    return {
+        "startup_s": round(startup, 2),
+        "requests": len(all_samples),
+        "errors": len(errors),
+        "req_per_s": round(len(all_samples) / elapsed, 1),
+        "latency": percentiles(all_samples),
+        "endpoints": {
+            name: {"req_per_s": round(len(values) / elapsed, 1), **percentiles(values)}
+            for name, values in samples.items()
+        },
+    }
+
+
+def compare_radius_query(n_trails: int, n_queries: int) -> dict:
+    """进程内对比：旧实现逐条计算距离 vs 网格索引 + 向量化 Haversine"""
+    os.environ["DM_SYNTHETIC_TRAILS"] = str(n_trails)
+    sys.path.insert(0, APP_DIRECTORY)
+    import main as app_main
+    snapshot = app_main.dm_secret_trail_store.snapshot
+    legacy_trails = [snapshot.to_dict(row) for row in range(len(snapshot))]
+
+    def legacy_query(lat, lng, max_distance_km):
+        filtered = []
+        for trail in legacy_trails:
+            distance = ((trail["location"]["lat"] - lat) ** 2 + (trail["location"]["lng"] - lng) ** 2) ** 0.5 * 111
+            if distance > max_distance_km:
+                continue
+            item = trail.copy()
+            item["distance_from_user_km"] = round(distance, 1)
+            filtered.append(item)
+        filtered.sort(key=lambda x: x["distance_from_user_km"])
+        return filtered[:20]
+
+    def indexed_query(lat, lng, max_distance_km):
+        rows, distances = snapshot.within(lat, lng, max_distance_km)
+        return [snapshot.to_dict(int(r), d) for r, d in zip(rows[:20], distances[:20])]
+
+    rng = random.Random(0)
+    queries = [(*_random_point(rng), 50) for _ in range(n_queries)]
+    results = {}
+    for name, fn in (("legacy_scan", legacy_query), ("grid_index", indexed_query)):
+        timings = []
+        for lat, lng, radius in queries:
+            start = time.perf_counter()
+            fn(lat, lng, radius)
+            timings.append(time.perf_counter() - start)
+        results[name] = percentiles(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hiking trails app load benchmark")
+    parser.add_argument("--trails", type=int, default=100_000, help="合成路线数量")
+    parser.add_argument("--duration", type=float, default=10.0, help="压测时长（秒）")
+    parser.add_argument("--clients", type=int, default=16, help="并发客户端线程数")
+    parser.add_argument("--compare-queries", type=int, default=50, help="进程内新旧实现对比的查询次数，0 为跳过")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    results = {
+        "trails": args.trails,
+        "clients": args.clients,
+        "load": run_load(args.trails, args.duration, args.clients),
+    }
+    if args.compare_queries:
+        results["radius_query_50km"] = compare_radius_query(args.trails, args.compare_queries)
+
+    report = json.dumps(results, ensure_ascii=False, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from benchmarks.fakes import offline_env
+from benchmarks.run import PROJECT_ROOT
+
+# 入口模块导入耗时：python -X importtime 的汇总
+# 用法（在项目根目录）：
+#   python -m benchmarks.import_time --runs 5
+#
+# 对 main.py（CLI 提示符出现前需要导入的部分）和 src/search_server.py（MCP Server 握手前需要导入的部分）
+# 各跑若干次新进程，统计顶层导入的累计耗时中位数与最重的模块，用于在不同提交之间对比冷启动。
+
+offline_env()
+
+ENTRY_POINTS = {
+    "cli": "import main",
+    "mcp_server": "import src.search_server",
+}
+
+# "import time: self [us] | cumulative | imported package"
+_LINE_PATTERN = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+
+def _importtime(statement: str) -> dict[str, int]:
+    """运行一次，返回 {顶层模块: 累计耗时(us)}"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=PROJECT_ROOT, env=dict(os.environ, PYTHONPATH=PROJECT_ROOT),
+        capture_output=True, text=True, check=True
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = _LINE_PATTERN.match(line)
+        # 缩进为 1 个空格的是顶层导入，累计耗时已包含其全部子模块
+        if match and len(match.group(3)) == 1:
+            modules[match.group(4)] = modules.get(match.group(4), 0) + int(match.group(2))
+    return modules
+
+
+def bench_entry_point(statement: str, runs: int, top: int) -> dict:
+    totals, per_module = [], {}
+    for _ in range(runs):
+        modules = _importtime(statement)
+        totals.append(sum(modules.values()))
+        for name, us in modules.items():
+            per_module.setdefault(name, []).append(us)
+    heaviest = sorted(per_module.items(), key=lambda item: statistics.median(item[1]), reverse=True)[:top]
+    return {
+        "total_ms_median": round(statistics.median(totals) / 1000, 1),
+        "total_ms_min": round(min(totals) / 1000, 1),
+        "heaviest_ms": {name: round(statistics.median(samples) / 1000, 1) for name, samples in heaviest},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DevMate import-time benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="每个入口的测量次数")
+    parser.add_argument("--top", type=int, default=10, help="列出最重的顶层模块数")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    results = {
+        name: bench_entry_point(statement, args.runs, args.top)
+        for name, statement in ENTRY_POINTS.items()
+    }
+
+    report = json.dumps(results, ensure_ascii=False, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from benchmarks.fakes import offline_env, FakeEmbeddings, ScriptedChatModel
+from benchmarks.run import PROJECT_ROOT, percentiles
+
+# 规范预取（PREFETCH_RULES）对比：每轮的 LLM 调用次数与耗时
+# 用法（在项目根目录）：
+#   python -m benchmarks.prefetch --turns 20 --llm-latency 0.8
+#
+# 脚本化模型模拟真实行为：上下文里还没有规范时先调用 search_local_docs，
+# 已经有规范（自己查过或被预取注入）时直接写文件，然后给出最终回复。
+# 检索走真实的 docs/ 语料（确定性 Embedding），LLM 往返用 --llm-latency 模拟。
+
+offline_env()
+
+SCRIPT = [
+    [("search_local_docs", {"query": "全局变量命名与 API 响应规范"})],
+    [("write_files", {"files": [
+        {"file_path": "bench_app/main.py", "content": "dm_secret_trails = []\n" * 200},
+        {"file_path": "bench_app/static/index.html", "content": "<html></html>\n" * 200},
+    ]})],
+    "任务完成：已生成 bench_app/main.py, bench_app/static/index.html",
+]
+
+
+class RulesAwareChatModel(ScriptedChatModel):
+    """本轮已有 search_local_docs 结果时跳过"查规范"这一步，并统计模型调用次数"""
+
+    calls: int = 0
+
+    def _step(self, messages) -> int:
+        from langchain_core.messages import HumanMessage, ToolMessage
+        turn = []
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            turn.append(message)
+        if any(getattr(m, "tool_calls", None) and m.tool_calls[0]["name"] == "write_files" for m in turn):
+            return 2
+        has_rules = any(isinstance(m, ToolMessage) and m.name == "search_local_docs" for m in turn)
+        return 1 if has_rules else 0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def bench_mode(prefetch: bool, n_turns: int, llm_latency: float) -> dict:
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from src import agent
+    from src.config import settings
+
+    settings.PREFETCH_RULES = prefetch
+    model = RulesAwareChatModel(script=SCRIPT, latency=llm_latency)
+    agent_app, system_prompt = agent.create_agent(llm=model)
+
+    turn_samples, iterations = [], []
+    for i in range(n_turns):
+        messages = [SystemMessage(content=system_prompt), HumanMessage(content=f"做一个符合内部规范的徒步网站 #{i}")]
+        before = model.calls
+        start = time.perf_counter()
+        agent_app.invoke({"messages": messages}, config={"recursion_limit": 50})
+        turn_samples.append(time.perf_counter() - start)
+        iterations.append(model.calls - before)
+
+    return {
+        "llm_calls_per_turn": round(sum(iterations) / len(iterations), 2),
+        "turn": percentiles(turn_samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DevMate rules prefetch benchmark")
+    parser.add_argument("--turns", type=int, default=20, help="每种模式的对话轮数")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="脚本化模型每次调用的模拟耗时（秒）")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="devmate-prefetch-")
+    os.chdir(workdir)
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            from src import rag
+            rag._build_embeddings = lambda: FakeEmbeddings()
+            shutil.copytree(os.path.join(PROJECT_ROOT, "docs"), rag.DOCS_DIRECTORY)
+            rag.ingest_docs(rebuild=True)
+            results = {
+                "simulated_llm_latency_ms": args.llm_latency * 1000,
+                "without_prefetch": bench_mode(False, args.turns, args.llm_latency),
+                "with_prefetch": bench_mode(True, args.turns, args.llm_latency),
+            }
+    finally:
+        os.chdir(PROJECT_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = json.dumps(results, ensure_ascii=False, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from benchmarks.fakes import offline_env, FakeEmbeddings
+from benchmarks.run import PROJECT_ROOT, percentiles
+
+# 检索质量/延迟对比：vector / lexical / hybrid 三种模式
+# 用法（在项目根目录）：
+#   python -m benchmarks.retrieval --distractors 300
+#
+# 语料为真实的 docs/ 规范 + 不含规范标识符的干扰文档；每条标注查询给出答案切片中必须出现的子串，
+# 统计 recall@k（前 k 个结果中至少一个命中）与查询延迟。
+
+offline_env()
+
+# (查询, 命中切片应包含的子串)
+LABELED_QUERIES = [
+    ("dm_secret_", "dm_secret_"),
+    ("`dm_secret_user_count` 是什么意思", "dm_secret_"),
+    ("happiness_level", "happiness_level"),
+    ("响应体必须包含哪个字段？", "happiness_level"),
+    ("Git 提交咒语", "DevMate Rocks!"),
+    ("commit message 末尾要加什么", "DevMate Rocks!"),
+    ("全局变量命名", "dm_secret_"),
+    ("变量命名有什么要求？", "dm_secret_"),
+]
+
+
+def _make_corpus(docs_dir: str, n_distractors: int):
+    shutil.copytree(os.path.join(PROJECT_ROOT, "docs"), docs_dir)
+    topics = ["缓存", "日志", "部署", "数据库", "前端", "测试", "监控", "权限"]
+    for i in range(n_distractors):
+        topic = topics[i % len(topics)]
+        with open(os.path.join(docs_dir, f"distractor_{i:05d}.md"), "w", encoding="utf-8") as f:
+            f.write(
+                f"# {topic}说明 {i}\n\n"
+                f"本节介绍{topic}相关的变量配置、接口响应格式和提交流程，"
+                f"所有服务统一使用 FastAPI 和 Python 3.13。第 {i} 版修订。\n"
+            )
+
+
+def bench_retrieval(n_distractors: int, k: int, repeat: int) -> dict:
+    from src import rag
+
+    rag._build_embeddings = lambda: FakeEmbeddings()
+    _make_corpus(rag.DOCS_DIRECTORY, n_distractors)
+    rag.ingest_docs(rebuild=True)
+
+    results = {}
+    for mode in ("vector", "lexical", "hybrid"):
+        hits, samples = 0, []
+        for query, expected in LABELED_QUERIES:
+            docs = rag.query_knowledge_base(query, k=k, mode=mode)
+            hits += any(expected in doc.page_content for doc in docs)
+            # 只测未命中结果缓存时的检索路径
+            for _ in range(repeat):
+                rag._result_cache.clear()
+                start = time.perf_counter()
+                rag.query_knowledge_base(query, k=k, mode=mode)
+                samples.append(time.perf_counter() - start)
+        results[mode] = {
+            f"recall@{k}": round(hits / len(LABELED_QUERIES), 3),
+            "latency": percentiles(samples),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DevMate retrieval benchmark")
+    parser.add_argument("--distractors", type=int, default=300, help="干扰文档数量")
+    parser.add_argument("--k", type=int, default=2, help="每次检索返回的切片数")
+    parser.add_argument("--repeat", type=int, default=20, help="每条查询的计时次数")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="devmate-retrieval-")
+    os.chdir(workdir)
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            results = {
+                "queries": len(LABELED_QUERIES),
+                "distractors": args.distractors,
+                "modes": bench_retrieval(args.distractors, args.k, args.repeat),
+            }
+    finally:
+        os.chdir(PROJECT_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = json.dumps(results, ensure_ascii=False, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import contextlib
+from benchmarks.fakes import offline_env, FakeEmbeddings, ScriptedChatModel
+
+# DevMate 离线端到端基准测试
+# 用法（在项目根目录）：
+#   python -m benchmarks.run                      # 输出 JSON 到 stdout
+#   python -m benchmarks.run --output bench.json  # 同时写入文件，便于不同提交之间对比
+#
+# 覆盖：完整 Agent 图（脚本化模型）、ingest_docs / query_knowledge_base（确定性 Embedding）、
+# search_server 的 MCP 往返（Tavily 桩）。全程不访问网络。
+
+offline_env()
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentiles(samples: list[float]) -> dict:
+    """返回毫秒单位的 p50/p95/p99/max"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pick(50) * 1000, 3),
+        "p95_ms": round(pick(95) * 1000, 3),
+        "p99_ms": round(pick(99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _make_corpus(docs_dir: str, n_docs: int):
+    """真实的 docs/ 规范文档 + n_docs 篇合成文档"""
+    shutil.copytree(os.path.join(PROJECT_ROOT, "docs"), docs_dir)
+    paragraph = "本服务使用 FastAPI 提供接口，全局变量以 dm_secret_ 开头，响应包含 happiness_level 字段。\n"
+    for i in range(n_docs):
+        with open(os.path.join(docs_dir, f"synthetic_{i:05d}.md"), "w", encoding="utf-8") as f:
+            f.write(f"# 合成文档 {i}\n\n" + paragraph * (20 + i % 30))
+
+
+def bench_rag(n_docs: int, n_queries: int) -> dict:
+    from src import rag
+
+    # 使用确定性 Embedding 替换远程模型
+    rag._build_embeddings = lambda: FakeEmbeddings()
+
+    _make_corpus(rag.DOCS_DIRECTORY, n_docs)
+    start = time.perf_counter()
+    rag.ingest_docs(rebuild=True)
+    ingest_seconds = time.perf_counter() - start
+    manifest = rag._load_manifest() or {"files": {}}
+    n_chunks = sum(len(entry["chunks"]) for entry in manifest["files"].values())
+
+    # 未变化时的增量摄入（只做哈希比对）
+    start = time.perf_counter()
+    rag.ingest_docs()
+    noop_seconds = time.perf_counter() - start
+
+    queries = [f"第 {i % 10} 条规范：变量命名有什么要求？" for i in range(n_queries)]
+    cold, warm = [], []
+    for query in queries:
+        start = time.perf_counter()
+        rag.query_knowledge_base(query)
+        (cold if len(cold) < 10 else warm).append(time.perf_counter() - start)
+
+    return {
+        "documents": n_docs + 1,
+        "chunks": n_chunks,
+        "ingest_seconds": round(ingest_seconds, 3),
+        "ingest_chunks_per_sec": round(n_chunks / ingest_seconds, 1) if ingest_seconds else None,
+        "incremental_noop_seconds": round(noop_seconds, 3),
+        "query_first_10": percentiles(cold),
+        "query_repeat": percentiles(warm),
+        "cache": rag.get_cache_stats(),
+    }
+
+
+def bench_mcp(n_calls: int) -> dict:
+    from src.mcp_client import MCPSearchClient
+
+    client = MCPSearchClient()
+    try:
+        start = time.perf_counter()
+        client.call_tool("search_web", {"query": "warm-up"})
+        startup = time.perf_counter() - start
+
+        samples = []
+        for i in range(n_calls):
+            start = time.perf_counter()
+            client.call_tool("search_web", {"query": f"python asyncio example {i}"})
+            samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        client.call_tool("search_web_batch", {"queries": [f"topic {i}" for i in range(5)]})
+        batch = time.perf_counter() - start
+    finally:
+        client.close()
+
+    return {
+        "first_call_with_server_start_ms": round(startup * 1000, 3),
+        "search_web": percentiles(samples),
+        "search_web_batch_5_queries_ms": round(batch * 1000, 3),
+    }
+
+
+def bench_agent(n_turns: int, llm_latency: float) -> dict:
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from src.agent import create_agent
+
+    agent_app, system_prompt = create_agent(llm=ScriptedChatModel(latency=llm_latency))
+    turn_samples, tool_samples = [], {}
+    for i in range(n_turns):
+        messages = [SystemMessage(content=system_prompt), HumanMessage(content=f"做一个徒步网站 #{i}")]
+        start = time.perf_counter()
+        for mode, chunk in agent_app.stream(
+            {"messages": messages},
+            config={"recursion_limit": 50},
+            stream_mode=["custom", "values"]
+        ):
+            if mode == "custom" and chunk.get("type") == "tool_end":
+                tool_samples.setdefault(chunk["name"], []).append(chunk["duration"])
+        turn_samples.append(time.perf_counter() - start)
+
+    return {
+        "simulated_llm_latency_ms": llm_latency * 1000,
+        "turn": percentiles(turn_samples),
+        "tools": {name: percentiles(samples) for name, samples in sorted(tool_samples.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DevMate offline benchmarks")
+    parser.add_argument("--docs", type=int, default=200, help="合成文档数量")
+    parser.add_argument("--queries", type=int, default=200, help="知识库查询次数")
+    parser.add_argument("--mcp-calls", type=int, default=50, help="MCP 搜索调用次数")
+    parser.add_argument("--turns", type=int, default=20, help="Agent 对话轮数")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="脚本化模型每次调用的模拟耗时（秒）")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    # 在临时目录中运行：chroma_db、docs、output 都是相对路径，不污染项目目录
+    workdir = tempfile.mkdtemp(prefix="devmate-bench-")
+    os.chdir(workdir)
+    try:
+        # 被测代码的进度输出转到 stderr，stdout 只保留 JSON 结果
+        with contextlib.redirect_stdout(sys.stderr):
+            results = {
+                "python": sys.version.split()[0],
+                "rag": bench_rag(args.docs, args.queries),
+                "mcp": bench_mcp(args.mcp_calls),
+                "agent": bench_agent(args.turns, args.llm_latency),
+                # Linux 上 ru_maxrss 单位为 KB
+                "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            }
+    finally:
+        os.chdir(PROJECT_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = json.dumps(results, ensure_ascii=False, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import contextlib
+from benchmarks.fakes import offline_env, FakeEmbeddings
+from benchmarks.run import PROJECT_ROOT, percentiles, _make_corpus
+
+# 向量库引擎对比：Chroma vs NumPy 内存映射矩阵（VECTOR_STORE=chroma|numpy）
+# 用法（在项目根目录）：
+#   python -m benchmarks.vector_store --docs 500
+#
+# 对每个引擎：全量摄入耗时、新进程中"打开向量库 + 首次查询"的冷启动耗时（不含 Python 模块导入）、
+# 热查询延迟分位数。两种引擎使用同一份语料和确定性 Embedding，只比较向量库本身。
+
+offline_env()
+# 只测纯向量检索路径
+os.environ["RAG_RETRIEVAL_MODE"] = "vector"
+
+QUERIES = [f"第 {i % 10} 条规范：变量命名有什么要求？" for i in range(50)]
+
+
+def _cold_probe(workdir: str, engine: str) -> float:
+    """在新进程中打开已有索引并执行一次查询，返回耗时（秒）"""
+    code = (
+        "import time\n"
+        "from benchmarks.fakes import offline_env, FakeEmbeddings\n"
+        "offline_env()\n"
+        "from src import rag\n"
+        "rag._build_embeddings = lambda: FakeEmbeddings()\n"
+        "start = time.perf_counter()\n"
+        "rag.query_knowledge_base('变量命名有什么要求？')\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    env = dict(os.environ, VECTOR_STORE=engine, PYTHONPATH=PROJECT_ROOT)
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=workdir, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def bench_engine(engine: str, n_docs: int, n_queries: int, cold_runs: int) -> dict:
+    from src import rag
+    from src.config import settings
+
+    settings.VECTOR_STORE = engine
+    rag._build_embeddings = lambda: FakeEmbeddings()
+    rag.invalidate_cache()
+
+    workdir = tempfile.mkdtemp(prefix=f"devmate-{engine}-")
+    os.chdir(workdir)
+    try:
+        _make_corpus(rag.DOCS_DIRECTORY, n_docs)
+        start = time.perf_counter()
+        rag.ingest_docs(rebuild=True)
+        ingest_seconds = time.perf_counter() - start
+
+        cold = [_cold_probe(workdir, engine) for _ in range(cold_runs)]
+
+        warm = []
+        for i in range(n_queries):
+            rag._result_cache.clear()
+            start = time.perf_counter()
+            rag.query_knowledge_base(QUERIES[i % len(QUERIES)])
+            warm.append(time.perf_counter() - start)
+        rag.invalidate_cache()
+    finally:
+        os.chdir(PROJECT_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "ingest_seconds": round(ingest_seconds, 3),
+        "cold_open_and_first_query": percentiles(cold),
+        "warm_query": percentiles(warm),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DevMate vector store benchmark")
+    parser.add_argument("--docs", type=int, default=500, help="合成文档数量")
+    parser.add_argument("--queries", type=int, default=200, help="热查询次数")
+    parser.add_argument("--cold-runs", type=int, default=5, help="冷启动测量次数（每次一个新进程）")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        results = {
+            engine: bench_engine(engine, args.docs, args.queries, args.cold_runs)
+            for engine in ("chroma", "numpy")
+        }
+
+    report = json.dumps(results, ensure_ascii=False, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
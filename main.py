@@ -1,58 +1,152 @@
 import os
 import sys
-from langchain_core.messages import HumanMessage, SystemMessage
+import asyncio
+import threading
 from src.config import settings
-from src.agent import create_agent
+from src.mcp_client import shutdown_search_client
 
 # 确保环境变量注入（为了 LangSmith）
 os.environ["LANGCHAIN_TRACING_V2"] = "true" if settings.LANGCHAIN_TRACING_V2 else "false"
 os.environ["LANGCHAIN_API_KEY"] = settings.LANGCHAIN_API_KEY
 os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
 
-def main():
+def _summarize_args(args: dict, limit: int = 40) -> str:
+    """把工具参数压缩成一行摘要（长内容只显示长度）"""
+    parts = []
+    for key, value in args.items():
+        text = str(value).replace("\n", " ")
+        if len(text) > limit:
+            text = f"{text[:limit]}... ({len(str(value))} chars)"
+        parts.append(f"{key}={text}")
+    return ", ".join(parts)
+
+
+async def _read_line(prompt: str) -> str:
+    """
+    在守护线程中执行阻塞的 input()，不卡住事件循环上的后台任务。
+    不使用 asyncio.to_thread：Ctrl+C 取消等待后，解释器退出时仍会等线程池中卡在 input() 的线程。
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def _set(setter, value):
+        if not future.done():
+            setter(value)
+
+    def _read():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(_set, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(_set, future.set_result, line)
+
+    threading.Thread(target=_read, name="stdin-reader", daemon=True).start()
+    return await future
+
+
+def _load_agent():
+    """导入 LangGraph / LangChain 并编译 Agent 图（较慢，在后台线程中执行）"""
+    from src.agent import create_async_agent
+    return create_async_agent()
+
+
+async def run_turn_streaming(agent_app, messages):
+    """
+    流式运行一轮对话：LLM token 实时打印，工具调用显示开始/结束与耗时。
+    返回本轮结束后的完整 state。
+    """
+    from src.agent import astream_turn
+    final_state = None
+    printing_tokens = False
+    async for event in astream_turn(agent_app, messages):
+        if event["type"] == "token":
+            if not printing_tokens:
+                print("\n🤖 Agent: ", end="", flush=True)
+                printing_tokens = True
+            print(event["content"], end="", flush=True)
+        elif event["type"] == "tool_start":
+            printing_tokens = False
+            print(f"\n🔧 {event['name']}({_summarize_args(event['args'])})", flush=True)
+        elif event["type"] == "tool_end":
+            mark = "✅" if event["status"] != "error" else "❌"
+            print(f"   {mark} {event['name']} finished in {event['duration']:.2f}s", flush=True)
+        elif event["type"] == "done":
+            final_state = event["state"]
+    print()
+    return final_state
+
+
+async def main():
     print("🤖 DevMate Starting...")
     
-    # 1. 创建 Agent
-    agent_app, system_prompt = create_agent()
+    # 1. 在后台线程中创建 Agent（异步版：模型与工具调用全程 await，不嵌套 asyncio.run）
+    # 重依赖的导入与图编译和用户输入第一条消息同时进行，提示符立即出现
+    agent_loading = asyncio.create_task(asyncio.to_thread(_load_agent))
+    agent_app = None
     
-    print("✅ Agent ready! (Type 'exit' to quit)")
+    print("Type 'exit' to quit")
     print("--------------------------------------------------")
     
     # 2. 交互循环
-    # 初始化对话历史，带上 System Prompt
-    messages = [SystemMessage(content=system_prompt)]
+    messages = []
     
-    while True:
-        try:
-            user_input = input("\n👤 User: ").strip()
-            if user_input.lower() in ["exit", "quit", "q"]:
-                print("Bye!")
-                break
-            if not user_input:
-                continue
+    try:
+        while True:
+            try:
+                user_input = (await _read_line("\n👤 User: ")).strip()
+                if user_input.lower() in ["exit", "quit", "q"]:
+                    print("Bye!")
+                    break
+                if not user_input:
+                    continue
+                    
+                if agent_app is None:
+                    agent_app, system_prompt = await agent_loading
+                    print("✅ Agent ready!")
+                    from langchain_core.messages import HumanMessage, SystemMessage
+                    # 初始化对话历史，带上 System Prompt
+                    messages = [SystemMessage(content=system_prompt)]
+
+                # 添加用户消息
+                messages.append(HumanMessage(content=user_input))
                 
-            # 添加用户消息
-            messages.append(HumanMessage(content=user_input))
-            
-            # 3. 调用 Agent
-            # stream_mode="updates" 可以看到每一步的动作
-            print("\n🤖 DevMate is thinking...")
-            
-            # 使用 invoke 运行图
-            final_state = agent_app.invoke({"messages": messages}, config={"recursion_limit": 50})
-            # 获取最新的 AI 回复
-            last_msg = final_state["messages"][-1]
-            print(f"\n🤖 Agent: {last_msg.content}")
-            
-            # 更新对话历史（LangGraph 每次返回完整的 state，我们需要维护上下文）
-            # 在简单的 demo 中，我们可以直接用 final_state["messages"] 作为下一轮的输入
-            messages = final_state["messages"]
-            
-        except KeyboardInterrupt:
-            print("\nAborted.")
-            break
-        except Exception as e:
-            print(f"\n❌ Error: {str(e)}")
+                # 3. 调用 Agent
+                print("\n🤖 DevMate is thinking...")
+                
+                if settings.STREAM_OUTPUT:
+                    # 流式输出：边生成边打印，并实时展示工具调用
+                    final_state = await run_turn_streaming(agent_app, messages)
+                else:
+                    # 使用 ainvoke 运行图
+                    final_state = await agent_app.ainvoke({"messages": messages}, config={"recursion_limit": 50})
+                    # 获取最新的 AI 回复
+                    last_msg = final_state["messages"][-1]
+                    print(f"\n🤖 Agent: {last_msg.content}")
+                
+                # 更新对话历史（LangGraph 每次返回完整的 state，我们需要维护上下文）
+                # 在简单的 demo 中，我们可以直接用 final_state["messages"] 作为下一轮的输入
+                messages = final_state["messages"]
+                
+            except (KeyboardInterrupt, EOFError):
+                print("\nAborted.")
+                break
+            except Exception as e:
+                print(f"\n❌ Error: {str(e)}")
+
+        # 打印本次运行的 LLM 缓存命中情况（未启用缓存时不打印）
+        if agent_app is not None:
+            from src.llm_cache import cache_report
+            report = cache_report()
+            if report:
+                print(f"📊 {report}")
+    finally:
+        # 关闭常驻的 MCP 搜索会话（Ctrl+C 取消主任务时同样执行）
+        shutdown_search_client()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        # asyncio.run 收到 SIGINT 时取消主任务，取消向上传播后在这里以 KeyboardInterrupt 结束
+        print("\nAborted.")
\ No newline at end of file
@@ -1,24 +1,35 @@
 """
 徒步路线展示网站 - 后端API
 遵循内部开发规范 V1.0
+
+数据按列存放在 NumPy 数组中，并建立网格空间索引：
+- 半径查询只扫描与查询圆相交的网格单元，候选点的 Haversine 距离向量化计算
+- 最近邻查询按半径倍增扩展搜索范围
+- 结果分页返回，只有当前页的路线会被组装成 JSON
+- 统计信息按数据版本缓存，增删路线后自动失效
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import List, Optional
-import random
-import json
 from datetime import datetime
+import os
+import threading
+import numpy as np
 
 # 全局变量遵循规范：以 dm_secret_ 开头
-dm_secret_trail_data = []
 dm_secret_user_location = {"lat": 40.7128, "lng": -74.0060}  # 默认纽约位置
 dm_secret_app_counter = 0
 
-app = FastAPI(title="徒步路线展示网站", version="1.0.0")
+dm_secret_earth_radius_km = 6371.0088
+# 网格单元边长（度），约 55 公里；常用查询半径（5~100 公里）只会覆盖少量单元
+dm_secret_grid_cell_deg = 0.5
+dm_secret_difficulties = ("easy", "medium", "hard")
+dm_secret_max_page_size = 100
+
+app = FastAPI(title="徒步路线展示网站", version="1.1.0")
 
 # 配置CORS
 app.add_middleware(
@@ -43,6 +54,19 @@ class Trail(BaseModel):
     features: List[str]
     image_url: Optional[str] = None
 
+class TrailCreate(BaseModel):
+    name: str
+    description: str = ""
+    difficulty: str = "easy"
+    distance_km: float
+    estimated_time_hours: float
+    elevation_gain_m: int = 0
+    lat: float
+    lng: float
+    rating: float = 0.0
+    features: List[str] = []
+    image_url: Optional[str] = None
+
 class UserLocation(BaseModel):
     lat: float
     lng: float
@@ -51,12 +75,262 @@ class TrailResponse(BaseModel):
     trails: List[Trail]
     user_location: dict
     timestamp: str
-    happiness_level: str  # 必须包含此字段
+    total: int
+    page: int
+    page_size: int
+    happiness_level: str = "max"  # 必须包含此字段
+
+
+# 向量化的 Haversine 距离（公里）：一个点对一组点
+def haversine_km(lat, lng, lat_rad, lng_rad, cos_lat):
+    """
+    :param lat, lng: 查询点（度）
+    :param lat_rad, lng_rad, cos_lat: 目标点的纬度/经度（弧度）及纬度余弦，预先计算好的数组
+    """
+    lat0, lng0 = np.radians(lat), np.radians(lng)
+    a = np.sin((lat_rad - lat0) / 2) ** 2 + np.cos(lat0) * cos_lat * np.sin((lng_rad - lng0) / 2) ** 2
+    return 2 * dm_secret_earth_radius_km * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class TrailSnapshot:
+    """
+    某一时刻的全部路线数据（只读）：数值列是 NumPy 数组，文本列是与之对齐的列表。
+    网格索引：行按 (纬度格, 经度格) 的键排序，同一纬度格内连续的经度格对应排序后的一段连续区间，
+    一次 searchsorted 就能取出。写操作会生成新快照并整体替换，读请求拿到的快照不会被修改。
+    """
+
+    def __init__(self, columns: dict, version: int):
+        self.version = version
+        self.ids = np.asarray(columns["id"], dtype=np.int64)
+        self.lat = np.asarray(columns["lat"], dtype=np.float64)
+        self.lng = np.asarray(columns["lng"], dtype=np.float64)
+        self.difficulty = np.asarray(columns["difficulty"], dtype=np.int8)
+        self.distance_km = np.asarray(columns["distance_km"], dtype=np.float64)
+        self.estimated_time_hours = np.asarray(columns["estimated_time_hours"], dtype=np.float64)
+        self.elevation_gain_m = np.asarray(columns["elevation_gain_m"], dtype=np.int32)
+        self.rating = np.asarray(columns["rating"], dtype=np.float64)
+        self.name = columns["name"]
+        self.description = columns["description"]
+        self.features = columns["features"]
+        self.image_url = columns["image_url"]
+
+        self.lat_rad = np.radians(self.lat)
+        self.lng_rad = np.radians(self.lng)
+        self.cos_lat = np.cos(self.lat_rad)
+
+        # 按 id 查找
+        self.id_order = np.argsort(self.ids, kind="stable")
+        self.sorted_ids = self.ids[self.id_order]
+
+        # 网格索引
+        self.n_lng_cells = int(np.ceil(360 / dm_secret_grid_cell_deg))
+        keys = self._cell_row(self.lat) * self.n_lng_cells + self._cell_col(self.lng)
+        self.grid_order = np.argsort(keys, kind="stable")
+        self.grid_keys = keys[self.grid_order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _cell_row(self, lat):
+        n_rows = int(np.ceil(180 / dm_secret_grid_cell_deg))
+        return np.clip(((np.asarray(lat) + 90) // dm_secret_grid_cell_deg).astype(np.int64), 0, n_rows - 1)
+
+    def _cell_col(self, lng):
+        return np.clip(((np.asarray(lng) + 180) // dm_secret_grid_cell_deg).astype(np.int64), 0, self.n_lng_cells - 1)
+
+    def candidates(self, lat: float, lng: float, radius_km: float) -> np.ndarray:
+        """与查询圆外接矩形相交的网格单元中的全部行号（超集，需再按精确距离过滤）"""
+        dlat = np.degrees(radius_km / dm_secret_earth_radius_km)
+        lat_lo, lat_hi = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+        # 矩形覆盖极点，或经度跨度超过半圈时直接全量扫描
+        cos_max = np.cos(np.radians(max(abs(lat_lo), abs(lat_hi))))
+        if lat_hi >= 90.0 or lat_lo <= -90.0 or cos_max <= 1e-9:
+            return np.arange(len(self))
+        dlng = np.degrees(radius_km / (dm_secret_earth_radius_km * cos_max))
+        if dlng >= 180:
+            return np.arange(len(self))
+
+        # 经度区间跨越 ±180° 时拆成两段
+        lng_lo, lng_hi = lng - dlng, lng + dlng
+        spans = []
+        if lng_lo < -180:
+            spans += [(lng_lo + 360, 180.0), (-180.0, lng_hi)]
+        elif lng_hi > 180:
+            spans += [(lng_lo, 180.0), (-180.0, lng_hi - 360)]
+        else:
+            spans.append((lng_lo, lng_hi))
+
+        rows = np.arange(self._cell_row(lat_lo), self._cell_row(lat_hi) + 1)
+        starts, ends = [], []
+        for span_lo, span_hi in spans:
+            base = rows * self.n_lng_cells
+            starts.append(np.searchsorted(self.grid_keys, base + self._cell_col(span_lo), side="left"))
+            ends.append(np.searchsorted(self.grid_keys, base + self._cell_col(span_hi), side="right"))
+        starts, ends = np.concatenate(starts), np.concatenate(ends)
+        slices = [self.grid_order[s:e] for s, e in zip(starts, ends) if e > s]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def within(self, lat: float, lng: float, radius_km: float, difficulty: Optional[int] = None):
+        """返回半径内（可选按难度过滤）的行号及其距离，按距离升序"""
+        rows = self.candidates(lat, lng, radius_km)
+        if difficulty is not None:
+            rows = rows[self.difficulty[rows] == difficulty]
+        distances = haversine_km(lat, lng, self.lat_rad[rows], self.lng_rad[rows], self.cos_lat[rows])
+        mask = distances <= radius_km
+        rows, distances = rows[mask], distances[mask]
+        order = np.argsort(distances, kind="stable")
+        return rows[order], distances[order]
+
+    def nearest(self, lat: float, lng: float, k: int, difficulty: Optional[int] = None):
+        """最近的 k 条路线：从一个网格单元的半径开始倍增，直到圈内至少有 k 条或已覆盖全球"""
+        radius = dm_secret_grid_cell_deg * 111.0
+        while True:
+            rows, distances = self.within(lat, lng, radius, difficulty)
+            if len(rows) >= k or radius >= np.pi * dm_secret_earth_radius_km:
+                return rows[:k], distances[:k]
+            radius *= 2
+
+    def row_of(self, trail_id: int) -> Optional[int]:
+        i = int(np.searchsorted(self.sorted_ids, trail_id))
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == trail_id:
+            return int(self.id_order[i])
+        return None
+
+    def to_dict(self, row: int, distance: Optional[float] = None) -> dict:
+        trail = {
+            "id": int(self.ids[row]),
+            "name": self.name[row],
+            "description": self.description[row],
+            "difficulty": dm_secret_difficulties[self.difficulty[row]],
+            "distance_km": float(self.distance_km[row]),
+            "estimated_time_hours": float(self.estimated_time_hours[row]),
+            "elevation_gain_m": int(self.elevation_gain_m[row]),
+            "location": {"lat": float(self.lat[row]), "lng": float(self.lng[row])},
+            "rating": float(self.rating[row]),
+            "features": self.features[row],
+            "image_url": self.image_url[row],
+        }
+        if distance is not None:
+            trail["distance_from_user_km"] = round(float(distance), 1)
+        return trail
+
+    def columns(self) -> dict:
+        return {
+            "id": self.ids, "lat": self.lat, "lng": self.lng, "difficulty": self.difficulty,
+            "distance_km": self.distance_km, "estimated_time_hours": self.estimated_time_hours,
+            "elevation_gain_m": self.elevation_gain_m, "rating": self.rating,
+            "name": self.name, "description": self.description,
+            "features": self.features, "image_url": self.image_url,
+        }
+
+
+class TrailStore:
+    """持有当前快照；写操作串行执行并原子替换快照，同时使统计缓存失效"""
+
+    def __init__(self):
+        self.snapshot = TrailSnapshot(_empty_columns(), version=0)
+        self._lock = threading.Lock()
+        self._stats = None  # (version, stats)
+
+    def load(self, trails: List[dict]):
+        with self._lock:
+            columns = _empty_columns()
+            for trail in trails:
+                _append_trail(columns, trail)
+            self.snapshot = TrailSnapshot(columns, self.snapshot.version + 1)
+
+    def add(self, trail: dict) -> dict:
+        with self._lock:
+            current = self.snapshot
+            trail = {**trail, "id": int(current.ids.max()) + 1 if len(current) else 1}
+            row = _empty_columns()
+            _append_trail(row, trail)
+            columns = {
+                key: np.concatenate([value, np.asarray(row[key], dtype=value.dtype)])
+                if isinstance(value, np.ndarray) else value + row[key]
+                for key, value in current.columns().items()
+            }
+            self.snapshot = TrailSnapshot(columns, current.version + 1)
+            return trail
+
+    def remove(self, trail_id: int) -> bool:
+        with self._lock:
+            current = self.snapshot
+            row = current.row_of(trail_id)
+            if row is None:
+                return False
+            keep = np.ones(len(current), dtype=bool)
+            keep[row] = False
+            columns = {
+                key: value[keep] if isinstance(value, np.ndarray) else [v for v, k in zip(value, keep) if k]
+                for key, value in current.columns().items()
+            }
+            self.snapshot = TrailSnapshot(columns, current.version + 1)
+            return True
+
+    def stats(self) -> dict:
+        """按快照版本缓存的汇总统计，数据变化后首次访问时重新计算"""
+        snapshot = self.snapshot
+        cached = self._stats
+        if cached is not None and cached[0] == snapshot.version:
+            return cached[1]
+        counts = np.bincount(snapshot.difficulty, minlength=len(dm_secret_difficulties))
+        has_data = len(snapshot) > 0
+        stats = {
+            "total_trails": len(snapshot),
+            "by_difficulty": {name: int(counts[i]) for i, name in enumerate(dm_secret_difficulties)},
+            "avg_rating": round(float(snapshot.rating.mean()), 2) if has_data else 0.0,
+            "avg_distance_km": round(float(snapshot.distance_km.mean()), 2) if has_data else 0.0,
+            "total_distance_km": round(float(snapshot.distance_km.sum()), 1),
+            "data_version": snapshot.version,
+        }
+        self._stats = (snapshot.version, stats)
+        return stats
+
+
+def _empty_columns() -> dict:
+    return {key: [] for key in (
+        "id", "lat", "lng", "difficulty", "distance_km", "estimated_time_hours",
+        "elevation_gain_m", "rating", "name", "description", "features", "image_url"
+    )}
+
+
+def _append_trail(columns: dict, trail: dict):
+    columns["id"].append(trail["id"])
+    columns["lat"].append(trail["location"]["lat"] if "location" in trail else trail["lat"])
+    columns["lng"].append(trail["location"]["lng"] if "location" in trail else trail["lng"])
+    columns["difficulty"].append(dm_secret_difficulties.index(trail["difficulty"]))
+    columns["distance_km"].append(trail["distance_km"])
+    columns["estimated_time_hours"].append(trail["estimated_time_hours"])
+    columns["elevation_gain_m"].append(trail.get("elevation_gain_m", 0))
+    columns["rating"].append(trail.get("rating", 0.0))
+    columns["name"].append(trail["name"])
+    columns["description"].append(trail.get("description", ""))
+    columns["features"].append(list(trail.get("features", [])))
+    columns["image_url"].append(trail.get("image_url"))
+
+
+dm_secret_trail_store = TrailStore()
+
+
+def _difficulty_code(difficulty: Optional[str]) -> Optional[int]:
+    if not difficulty:
+        return None
+    if difficulty not in dm_secret_difficulties:
+        raise HTTPException(status_code=400, detail=f"未知的难度级别: {difficulty}")
+    return dm_secret_difficulties.index(difficulty)
+
+
+def _resolve_location(lat: Optional[float], lng: Optional[float]) -> dict:
+    global dm_secret_user_location
+    # 如果提供了位置参数，更新用户位置
+    if lat is not None and lng is not None:
+        dm_secret_user_location = {"lat": lat, "lng": lng}
+    return dm_secret_user_location
+
 
 # 初始化示例数据
 def initialize_trail_data():
-    global dm_secret_trail_data
-    
     sample_trails = [
         {
             "id": 1,
@@ -124,13 +398,32 @@ def initialize_trail_data():
             "image_url": "https://images.unsplash.com/photo-1551632811-561732d1e306?w=800"
         }
     ]
-    
-    dm_secret_trail_data = sample_trails
 
-# 计算两点之间的距离（简化版）
-def calculate_distance(lat1, lng1, lat2, lng2):
-    # 简化计算，实际应用中应使用更精确的公式
-    return ((lat2 - lat1) ** 2 + (lng2 - lng1) ** 2) ** 0.5 * 111  # 大约公里数
+    # 压测用：DM_SYNTHETIC_TRAILS=100000 时追加随机生成的路线（固定随机种子，可复现）
+    synthetic = int(os.environ.get("DM_SYNTHETIC_TRAILS", "0"))
+    if synthetic > 0:
+        rng = np.random.default_rng(42)
+        lats = rng.uniform(25.0, 49.0, synthetic)
+        lngs = rng.uniform(-124.0, -67.0, synthetic)
+        levels = rng.integers(0, len(dm_secret_difficulties), synthetic)
+        lengths = rng.uniform(1.0, 30.0, synthetic).round(1)
+        for i in range(synthetic):
+            sample_trails.append({
+                "id": len(sample_trails) + 1,
+                "name": f"路线 #{i + 1}",
+                "description": "自动生成的测试路线",
+                "difficulty": dm_secret_difficulties[levels[i]],
+                "distance_km": float(lengths[i]),
+                "estimated_time_hours": round(float(lengths[i]) / 3.5, 1),
+                "elevation_gain_m": int(lengths[i] * 40),
+                "location": {"lat": float(lats[i]), "lng": float(lngs[i])},
+                "rating": round(float(3.0 + 2.0 * (i % 100) / 99), 1),
+                "features": [],
+                "image_url": None,
+            })
+
+    dm_secret_trail_store.load(sample_trails)
+
 
 # API端点
 @app.get("/")
@@ -142,66 +435,90 @@ async def read_root():
 async def get_trails(
     lat: Optional[float] = None,
     lng: Optional[float] = None,
-    max_distance_km: Optional[float] = 50.0,
-    difficulty: Optional[str] = None
+    max_distance_km: float = Query(50.0, gt=0),
+    difficulty: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=dm_secret_max_page_size)
 ):
-    """获取附近的徒步路线"""
-    global dm_secret_user_location, dm_secret_app_counter
-    
+    """获取附近的徒步路线（按距离排序，分页）"""
+    global dm_secret_app_counter
+
     # 更新计数器
     dm_secret_app_counter += 1
-    
-    # 如果提供了位置参数，更新用户位置
-    if lat is not None and lng is not None:
-        dm_secret_user_location = {"lat": lat, "lng": lng}
-    
-    user_lat = dm_secret_user_location["lat"]
-    user_lng = dm_secret_user_location["lng"]
-    
-    # 过滤路线
-    filtered_trails = []
-    for trail in dm_secret_trail_data:
-        # 计算距离
-        distance = calculate_distance(
-            user_lat, user_lng,
-            trail["location"]["lat"], trail["location"]["lng"]
-        )
-        
-        # 应用过滤器
-        if distance > max_distance_km:
-            continue
-        
-        if difficulty and trail["difficulty"] != difficulty:
-            continue
-        
-        # 添加距离信息
-        trail_with_distance = trail.copy()
-        trail_with_distance["distance_from_user_km"] = round(distance, 1)
-        filtered_trails.append(trail_with_distance)
-    
-    # 按距离排序
-    filtered_trails.sort(key=lambda x: x["distance_from_user_km"])
-    
+
+    location = _resolve_location(lat, lng)
+    snapshot = dm_secret_trail_store.snapshot
+    rows, distances = snapshot.within(
+        location["lat"], location["lng"], max_distance_km, _difficulty_code(difficulty)
+    )
+
+    # 只组装当前页
+    start = (page - 1) * page_size
+    page_trails = [
+        snapshot.to_dict(int(row), distance)
+        for row, distance in zip(rows[start:start + page_size], distances[start:start + page_size])
+    ]
+
     # 构建响应，必须包含 happiness_level 字段
-    response = {
-        "trails": filtered_trails,
-        "user_location": dm_secret_user_location,
+    return {
+        "trails": page_trails,
+        "user_location": location,
         "timestamp": datetime.now().isoformat(),
+        "total": len(rows),
+        "page": page,
+        "page_size": page_size,
         "happiness_level": "max",  # 遵循规范
         "stats": {
-            "total_trails": len(filtered_trails),
+            "total_trails": len(rows),
             "app_counter": dm_secret_app_counter
         }
     }
-    
-    return response
+
+@app.get("/api/trails/nearest")
+async def get_nearest_trails(
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    k: int = Query(10, ge=1, le=dm_secret_max_page_size),
+    difficulty: Optional[str] = None
+):
+    """获取离用户最近的 k 条路线"""
+    location = _resolve_location(lat, lng)
+    snapshot = dm_secret_trail_store.snapshot
+    rows, distances = snapshot.nearest(location["lat"], location["lng"], k, _difficulty_code(difficulty))
+    return {
+        "trails": [snapshot.to_dict(int(row), distance) for row, distance in zip(rows, distances)],
+        "user_location": location,
+        "timestamp": datetime.now().isoformat(),
+        "happiness_level": "max"  # 遵循规范
+    }
+
+@app.post("/api/trails")
+async def create_trail(trail: TrailCreate):
+    """新增路线（统计缓存随之失效）"""
+    _difficulty_code(trail.difficulty)
+    created = dm_secret_trail_store.add(trail.model_dump())
+    return {
+        "message": "路线添加成功",
+        "trail_id": created["id"],
+        "happiness_level": "max"  # 遵循规范
+    }
+
+@app.delete("/api/trails/{trail_id}")
+async def delete_trail(trail_id: int):
+    """删除路线（统计缓存随之失效）"""
+    if not dm_secret_trail_store.remove(trail_id):
+        raise HTTPException(status_code=404, detail="路线未找到")
+    return {
+        "message": "路线删除成功",
+        "happiness_level": "max"  # 遵循规范
+    }
 
 @app.post("/api/location")
 async def update_location(location: UserLocation):
     """更新用户位置"""
     global dm_secret_user_location
     dm_secret_user_location = {"lat": location.lat, "lng": location.lng}
-    
+
     return {
         "message": "位置更新成功",
         "new_location": dm_secret_user_location,
@@ -211,20 +528,20 @@ async def update_location(location: UserLocation):
 @app.get("/api/trails/{trail_id}")
 async def get_trail_detail(trail_id: int):
     """获取特定路线的详细信息"""
-    for trail in dm_secret_trail_data:
-        if trail["id"] == trail_id:
-            return {
-                "trail": trail,
-                "happiness_level": "max"  # 遵循规范
-            }
-    
-    raise HTTPException(status_code=404, detail="路线未找到")
+    snapshot = dm_secret_trail_store.snapshot
+    row = snapshot.row_of(trail_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="路线未找到")
+    return {
+        "trail": snapshot.to_dict(row),
+        "happiness_level": "max"  # 遵循规范
+    }
 
 @app.get("/api/stats")
 async def get_stats():
-    """获取应用统计信息"""
+    """获取应用统计信息（汇总部分按数据版本缓存）"""
     return {
-        "total_trails": len(dm_secret_trail_data),
+        **dm_secret_trail_store.stats(),
         "app_counter": dm_secret_app_counter,
         "user_location": dm_secret_user_location,
         "happiness_level": "max"  # 遵循规范
@@ -235,4 +552,4 @@ initialize_trail_data()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
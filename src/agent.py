@@ -1,15 +1,22 @@
-import os
-import sys
+import hashlib
 import asyncio
-from typing import Annotated, Literal, TypedDict
+import logging
+from typing import TypedDict
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
-from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import ToolNode
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from langgraph.graph import StateGraph, MessagesState, START, END
 from src.config import settings
-from src.rag import query_knowledge_base
+from src.context import compact_messages, count_tokens
+from src.context_packing import pack_documents, report_savings
+from src.file_writer import resolve_output_path, write_atomic
+from src.llm_cache import build_llm_cache
+from src.llm_gateway import get_gateway, response_tokens
+from src.metrics import incr, span
+from src.rules import check_file, format_violations
+from src.mcp_client import get_search_client
+from src.tool_executor import ParallelToolNode
+
+logger = logging.getLogger(__name__)
 
 # --- 1. 定义工具集 ---
 
@@ -20,11 +27,15 @@ def search_local_docs(query: str) -> str:
     查阅本地知识库/内部文档。
     当用户询问关于'内部规范'、'项目特定规则'、'自定义库用法'等问题时，必须优先使用此工具。
     """
+    # 首次调用时才加载 RAG 模块（Chroma / Embedding 依赖较重，不拖慢启动）
+    from src.rag import query_knowledge_base
     results = query_knowledge_base(query)
     if not results:
         return "本地文档中未找到相关内容。"
-    
-    formatted = "\n\n".join([f"[文档片段]:\n{doc.page_content}" for doc in results])
+
+    # 合并重叠切片并按 token 预算截断
+    formatted, before, after = pack_documents(results, settings.CONTEXT_PACK_DOCS_MAX_TOKENS)
+    report_savings("search_local_docs", before, after)
     return formatted
 
 # (B) 文件写入工具
@@ -35,28 +46,75 @@ def write_file(file_path: str, content: str) -> str:
     将内容写入到 'output' 目录下的指定文件。
     ...
     """
-    # 强制加上 output/ 前缀
-    if not file_path.startswith("output/"):
-        file_path = os.path.join("output", file_path)
     try:
-        # --- 修复开始 ---
-        # 获取父目录
-        directory = os.path.dirname(file_path)
-        # 只有当 directory 不为空时，才尝试创建目录
-        if directory:
-            os.makedirs(directory, exist_ok=True)
-        # --- 修复结束 ---
-        
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(content)
+        # 强制写到 output/ 下（解析后越界的路径直接拒绝）
+        file_path, full_path = resolve_output_path(file_path)
+        # 本地规范检查：违规的 .py 文件不落盘，直接把行号和规则返回给模型当场修正
+        violations = check_file(file_path, content)
+        if violations:
+            return format_violations(file_path, violations)
+        status, _, _ = write_atomic(full_path, content)
+        if status == "unchanged":
+            return f"Unchanged (identical content): {file_path}"
         return f"Successfully wrote to {file_path}"
     except Exception as e:
         return f"Error writing file: {str(e)}"
 
+
+class FileSpec(TypedDict):
+    file_path: str
+    content: str
+
+
+@tool
+def write_files(files: list[FileSpec]) -> str:
+    """
+    一次性将多个文件写入 'output' 目录（每项包含 file_path 和 content）。
+    交付一个项目的多个文件时，优先用它代替多次调用 write_file。
+    内容未变化的文件会被跳过，违反内部规范的 .py 文件会被拒绝写入，返回每个文件的写入结果清单。
+    """
+    # 1. 先校验全部路径：任何一个越界或重复，整批都不写
+    resolved, errors = [], []
+    seen = set()
+    for spec in files:
+        try:
+            file_path, full_path = resolve_output_path(spec["file_path"])
+        except ValueError as e:
+            errors.append(str(e))
+            continue
+        if full_path in seen:
+            errors.append(f"路径 '{file_path}' 在本次调用中重复出现")
+            continue
+        seen.add(full_path)
+        resolved.append((file_path, full_path, spec["content"]))
+    if errors:
+        return "Error: nothing written.\n" + "\n".join(f"  - {e}" for e in errors)
+
+    # 2. 逐个原子写入，单个文件失败不影响其他文件
+    lines, counts = [], {"written": 0, "unchanged": 0, "rejected": 0, "error": 0}
+    for file_path, full_path, content in resolved:
+        violations = check_file(file_path, content)
+        if violations:
+            counts["rejected"] += 1
+            lines.append(f"  {'rejected':<9} {file_path}")
+            lines.extend(f"    line {v['line']} [{v['rule']}]: {v['message']}" for v in violations)
+            continue
+        try:
+            status, digest, size = write_atomic(full_path, content)
+            lines.append(f"  {status:<9} {file_path} ({size} B, sha256 {digest[:12]})")
+        except OSError as e:
+            status = "error"
+            lines.append(f"  {status:<9} {file_path}: {str(e)}")
+        counts[status] += 1
+
+    summary = f"{counts['written']} written, {counts['unchanged']} unchanged, {counts['error']} failed"
+    if counts["rejected"]:
+        summary += f", {counts['rejected']} rejected by internal rules (fix them and write those files again)"
+    return summary + "\n" + "\n".join(lines)
+
 # (C) MCP 网络搜索工具的封装
-# 由于 MCP Client 是异步且有状态的 (Context Manager)，我们需要一种特殊方式来调用它。
-# 为了简化面试项目，我们在这里使用一个简化的同步包装器，或者在 Agent 运行时动态绑定。
-# 这里我们采用一种直接调用的方式（每次调用启动一次 Client，效率略低但实现简单稳定）。
+# MCP Client 是异步且有状态的 (Context Manager)，这里通过 src.mcp_client 中的常驻客户端调用：
+# search server 只在第一次搜索时启动一次，之后复用已初始化的会话，断开时自动重启。
 
 @tool
 def search_web(query: str) -> str:
@@ -64,47 +122,58 @@ def search_web(query: str) -> str:
     使用 Tavily 搜索互联网最新信息。
     当本地文档无法回答，或者需要查询通用技术知识（如 Python 最新语法、库的用法）时使用。
     """
-    async def _run_mcp():
-        # 设置环境变量以确保子进程能找到 src
-        env = os.environ.copy()
-        env["PYTHONPATH"] = os.getcwd()
-        
-        server_params = StdioServerParameters(
-            command=sys.executable,
-            args=["src/search_server.py"],
-            env=env
-        )
-        
-        async with stdio_client(server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                result = await session.call_tool("search_web", arguments={"query": query})
-                return "\n".join([c.text for c in result.content])
+    try:
+        return get_search_client().call_tool("search_web", {"query": query})
+    except Exception as e:
+        return f"Web search failed: {str(e)}"
 
+@tool
+def search_web_batch(queries: list[str]) -> str:
+    """
+    并发执行多个互联网搜索，结果按 URL 去重合并后一次性返回。
+    需要同时查询多个技术问题时，优先用它代替多次调用 search_web。
+    """
     try:
-        return asyncio.run(_run_mcp())
+        return get_search_client().call_tool("search_web_batch", {"queries": queries})
     except Exception as e:
         return f"Web search failed: {str(e)}"
 
-# --- 2. 构建 Agent ---
+# (D) 异步实现
+# 供 create_async_agent 的 ainvoke/astream 路径使用，不在工具内部新建事件循环，
+# 阻塞型操作（向量检索、文件 I/O）放到线程池中执行。
 
-def create_agent():
-    # 1. 准备工具列表
-    tools = [search_local_docs, write_file, search_web]
-    
-    # 2. 初始化 LLM
-    llm = ChatOpenAI(
-        base_url=settings.AI_BASE_URL,
-        api_key=settings.API_KEY,
-        model=settings.MODEL_NAME,
-        temperature=0
-    )
-    
-    # 3. 绑定工具
-    llm_with_tools = llm.bind_tools(tools)
-    
-    # 4. 定义系统提示词
-    SYSTEM_PROMPT = SYSTEM_PROMPT = """你是一个全能编程助手 DevMate。
+async def _asearch_local_docs(query: str) -> str:
+    return await asyncio.to_thread(search_local_docs.func, query)
+
+async def _awrite_file(file_path: str, content: str) -> str:
+    return await asyncio.to_thread(write_file.func, file_path, content)
+
+async def _awrite_files(files: list[FileSpec]) -> str:
+    return await asyncio.to_thread(write_files.func, files)
+
+async def _asearch_web(query: str) -> str:
+    try:
+        return await get_search_client().acall_tool("search_web", {"query": query})
+    except Exception as e:
+        return f"Web search failed: {str(e)}"
+
+async def _asearch_web_batch(queries: list[str]) -> str:
+    try:
+        return await get_search_client().acall_tool("search_web_batch", {"queries": queries})
+    except Exception as e:
+        return f"Web search failed: {str(e)}"
+
+search_local_docs.coroutine = _asearch_local_docs
+write_file.coroutine = _awrite_file
+write_files.coroutine = _awrite_files
+search_web.coroutine = _asearch_web
+search_web_batch.coroutine = _asearch_web_batch
+
+TOOLS = [search_local_docs, write_file, write_files, search_web, search_web_batch]
+
+# --- 2. 系统提示词 ---
+
+SYSTEM_PROMPT = """你是一个全能编程助手 DevMate。
 你的目标是帮助用户快速构建原型、编写代码并生成项目文件。
 
 核心决策原则：
@@ -112,39 +181,125 @@ def create_agent():
 
 2. **知识检索与严格合规**:
    - 涉及具体实现细节（如 API 用法）时，才使用 [search_web]。搜到第一个可用示例就停止。
+   - 需要同时查多个问题时，用 [search_web_batch] 一次性并发查询，不要连续多次调用 [search_web]。
    - 涉及项目规范时，**必须**查阅 [search_local_docs]。
    - **关键指令**: 生成的代码必须 **100% 严格遵守** 查到的内部规范（例如：全局变量前缀必须是 `dm_secret_`，API 响应必须包含特定字段等）。违反规范的代码是不可接受的。
+   - 写入 .py 文件时工具会自动检查规范：若返回 rejected 及具体行号，按提示修正后只重写被拒绝的文件，无需再次检索规范。
 
 3. **文件落地与隔离**:
-   - 必须使用 [write_file] 将代码写入文件。
+   - 必须使用 [write_files]（或单个文件时用 [write_file]）将代码写入文件。
    - **项目隔离**: 请为每个生成的项目创建一个具有描述性的子目录（例如 `output/hiking_app/`），将所有文件放在该目录下，避免不同项目的文件混淆。
-   - **一次性交付**: 在一轮交互中，连续调用多次 [write_file] 把所有必要文件（如 main.py, index.html）都写完，不要分批次问用户。
+   - **一次性交付**: 在一轮交互中，用一次 [write_files] 把所有必要文件（如 main.py, index.html）都写完，不要分批次问用户。
 
 4. **禁止啰嗦**: 文件写完后，直接回复“任务完成”并展示文件列表，不要反问用户意见。
 
 5. **自我修正**: 如果遇到工具报错，尝试修复参数重试。如果连续失败两次，则放弃该步骤并告知用户。
 """
 
-    # 5. 构建 LangGraph 图
-    # 这是一个标准的 ReAct 模式图
-    
-    from langgraph.graph import MessagesState
-    
-    # 定义节点函数
-    def call_model(state: MessagesState):
-        messages = state["messages"]
-        # 如果是第一条消息，且没有 SystemPrompt，可以在这里插入（简化起见，我们假设外部会在 messages[0] 传入 System 这里的逻辑略）
-        # 更好的方式是在 invoke 时传入 system message
-        response = llm_with_tools.invoke(messages)
-        return {"messages": [response]}
+# --- 3. 构建 Agent ---
+
+def _build_llm_with_tools(llm=None):
+    # 初始化 LLM 并绑定工具（可传入自定义模型，例如基准测试中的脚本化模型）
+    if llm is None:
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(
+            base_url=settings.AI_BASE_URL,
+            api_key=settings.API_KEY,
+            model=settings.MODEL_NAME,
+            temperature=0,
+            # 限速与 429 重试由 LLM 网关负责
+            max_retries=0
+        )
+    return llm.bind_tools(TOOLS)
 
-    # 构建图
+
+def _is_turn_start(messages) -> bool:
+    """本轮（最后一条用户消息之后）还没有模型回复时返回 True；预取注入的合成调用不算"""
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return True
+        if isinstance(message, AIMessage) and not all(
+            call["id"].startswith("prefetch_") for call in message.tool_calls or [{"id": ""}]
+        ):
+            return False
+    return True
+
+
+def compact_context(state: MessagesState):
+    """
+    上下文管理节点：每次调用模型前把历史压缩到 token 预算以内，并在每轮第一次调用前记录 prompt 规模。
+    """
+    updates, before, after = compact_messages(
+        state["messages"],
+        budget=settings.CONTEXT_TOKEN_BUDGET,
+        keep_turns=settings.CONTEXT_KEEP_TURNS,
+        max_result_tokens=settings.CONTEXT_TOOL_RESULT_MAX_TOKENS
+    )
+    if settings.CONTEXT_LOG_TOKENS and _is_turn_start(state["messages"]):
+        note = f" (compacted from ~{before})" if updates else ""
+        logger.info("Prompt context: ~%d tokens%s", after, note)
+    return {"messages": updates}
+
+
+# --- 预取内部规范（PREFETCH_RULES）---
+# 几乎每个构建请求的第一次模型调用都只是决定"先查规范"。开启后，每轮开始时直接用用户的消息检索知识库，
+# 以一对合成的 search_local_docs 工具调用/结果注入历史：第一次模型调用就能看到规范，省掉一次 LLM 往返。
+
+_PREFETCH_QUERY_MAX_CHARS = 500
+
+
+def _prefetch_query(state: MessagesState):
+    """仅在一轮开始时（最后一条是用户消息）返回检索用的查询，否则返回 None"""
+    last = state["messages"][-1]
+    if not isinstance(last, HumanMessage) or not isinstance(last.content, str) or not last.content.strip():
+        return None
+    return last.content.strip()[:_PREFETCH_QUERY_MAX_CHARS]
+
+
+def _prefetch_messages(query: str, result: str) -> list:
+    # id 由查询与结果内容决定：相同的预取在 LLM 缓存键中保持一致
+    digest = hashlib.sha256(f"{query}\0{result}".encode("utf-8")).hexdigest()[:12]
+    call_id = f"prefetch_{digest}"
+    return [
+        AIMessage(content="", tool_calls=[{"name": "search_local_docs", "args": {"query": query}, "id": call_id}]),
+        ToolMessage(content=result, name="search_local_docs", tool_call_id=call_id),
+    ]
+
+
+def prefetch_rules(state: MessagesState):
+    query = _prefetch_query(state)
+    if query is None:
+        return {"messages": []}
+    with span("rules.prefetch"):
+        result = search_local_docs.func(query)
+    return {"messages": _prefetch_messages(query, result)}
+
+
+async def aprefetch_rules(state: MessagesState):
+    query = _prefetch_query(state)
+    if query is None:
+        return {"messages": []}
+    with span("rules.prefetch"):
+        result = await _asearch_local_docs(query)
+    return {"messages": _prefetch_messages(query, result)}
+
+
+def _build_graph(call_model, call_tools, prefetch=None):
+    # 这是一个标准的 ReAct 模式图，模型调用前先经过上下文压缩
     workflow = StateGraph(MessagesState)
     
+    workflow.add_node("compact", compact_context)
     workflow.add_node("agent", call_model)
-    workflow.add_node("tools", ToolNode(tools))
+    workflow.add_node("tools", call_tools)
     
-    workflow.add_edge(START, "agent")
+    if prefetch is not None and settings.PREFETCH_RULES:
+        # 每轮开始先检索内部规范，再进入常规的 compact -> agent 循环
+        workflow.add_node("prefetch", prefetch)
+        workflow.add_edge(START, "prefetch")
+        workflow.add_edge("prefetch", "compact")
+    else:
+        workflow.add_edge(START, "compact")
+    workflow.add_edge("compact", "agent")
     
     # 条件边：如果 LLM 决定调用工具，走 tools 节点；否则结束
     def should_continue(state: MessagesState):
@@ -155,7 +310,131 @@ def create_agent():
         return END
         
     workflow.add_conditional_edges("agent", should_continue)
-    workflow.add_edge("tools", "agent") # 工具执行完回环给 agent 继续思考
+    workflow.add_edge("tools", "compact") # 工具执行完回环给 agent 继续思考
     
-    app = workflow.compile()
-    return app, SYSTEM_PROMPT
\ No newline at end of file
+    return workflow.compile()
+
+
+def _build_tool_node():
+    # 同一轮中相互独立的工具调用并发执行（例如一次性写多个文件 + 查文档）
+    return ParallelToolNode(
+        TOOLS,
+        max_concurrency=settings.TOOL_MAX_CONCURRENCY,
+        timeout=settings.TOOL_TIMEOUT
+    )
+
+
+def _expected_tokens(messages) -> int:
+    # TPM 限速用的预估：prompt + 预留的输出 token，调用完成后按实际用量修正
+    return count_tokens(messages) + settings.LLM_EXPECTED_COMPLETION_TOKENS
+
+
+def _record_llm_call(s, response, cache_hit: bool | None):
+    # 记录 token 用量与缓存命中（埋点关闭时均为空操作）
+    # cache_hit=None 表示未启用 LLM 缓存：不计入命中/未命中，避免命中率被拉低
+    usage = getattr(response, "usage_metadata", None) or {}
+    prompt_tokens = usage.get("input_tokens", 0)
+    completion_tokens = usage.get("output_tokens", 0)
+    s.set(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        tool_calls=len(getattr(response, "tool_calls", None) or [])
+    )
+    if cache_hit is not None:
+        s.set(cache_hit=cache_hit)
+        incr("devmate_cache_lookups_total", cache="llm", result="hit" if cache_hit else "miss")
+    if not cache_hit:
+        incr("devmate_llm_tokens_total", prompt_tokens, kind="prompt")
+        incr("devmate_llm_tokens_total", completion_tokens, kind="completion")
+
+
+def create_agent(llm=None):
+    """构建同步版 Agent，使用 invoke/stream 调用"""
+    llm_with_tools = _build_llm_with_tools(llm)
+    llm_cache = build_llm_cache(TOOLS)
+
+    # 定义节点函数
+    def call_model(state: MessagesState):
+        messages = state["messages"]
+        # System Prompt 由调用方放在 messages[0]
+        with span("llm.call", model=settings.MODEL_NAME, messages=len(messages)) as s:
+            # 开启 LLM 缓存时，相同输入直接复用上次的回复（temperature=0，结果确定）
+            if llm_cache is not None:
+                cached = llm_cache.lookup(messages)
+                if cached is not None:
+                    _record_llm_call(s, cached, cache_hit=True)
+                    return {"messages": [cached]}
+            response = get_gateway("chat").call(
+                lambda: llm_with_tools.invoke(messages),
+                tokens=_expected_tokens(messages),
+                usage=response_tokens
+            )
+            if llm_cache is not None:
+                llm_cache.store(messages, response)
+            _record_llm_call(s, response, cache_hit=False if llm_cache is not None else None)
+        return {"messages": [response]}
+
+    return _build_graph(call_model, _build_tool_node(), prefetch_rules), SYSTEM_PROMPT
+
+
+def create_async_agent(llm=None):
+    """
+    构建异步版 Agent，使用 ainvoke/astream 调用。
+    模型调用和工具执行全程 await，不阻塞事件循环，
+    同一个事件循环上可以并发驱动多个 Agent 运行。
+    """
+    llm_with_tools = _build_llm_with_tools(llm)
+    llm_cache = build_llm_cache(TOOLS)
+
+    async def call_model(state: MessagesState):
+        messages = state["messages"]
+        with span("llm.call", model=settings.MODEL_NAME, messages=len(messages)) as s:
+            if llm_cache is not None:
+                cached = await asyncio.to_thread(llm_cache.lookup, messages)
+                if cached is not None:
+                    _record_llm_call(s, cached, cache_hit=True)
+                    return {"messages": [cached]}
+            response = await get_gateway("chat").acall(
+                lambda: llm_with_tools.ainvoke(messages),
+                tokens=_expected_tokens(messages),
+                usage=response_tokens
+            )
+            if llm_cache is not None:
+                await asyncio.to_thread(llm_cache.store, messages, response)
+            _record_llm_call(s, response, cache_hit=False if llm_cache is not None else None)
+        return {"messages": [response]}
+
+    return _build_graph(call_model, _build_tool_node().acall, aprefetch_rules), SYSTEM_PROMPT
+
+
+async def astream_turn(agent_app, messages, recursion_limit: int = 50):
+    """
+    流式运行一轮对话，把 LangGraph 的多种流合并为统一的事件：
+      {"type": "token", "content": ...}                   模型输出的 token
+      {"type": "tool_start"/"tool_end", ...}               ParallelToolNode 推送的工具事件
+      {"type": "done", "state": ...}                       本轮结束后的完整 state
+    CLI 与 HTTP 服务共用这一事件格式。
+    """
+    final_state = None
+    # 已经逐 token 输出过的图步骤：同一步的完整消息再次出现时不重复输出
+    streamed_steps = set()
+    async for mode, chunk in agent_app.astream(
+        {"messages": messages},
+        config={"recursion_limit": recursion_limit},
+        stream_mode=["messages", "custom", "values"]
+    ):
+        if mode == "messages":
+            message, metadata = chunk
+            if metadata.get("langgraph_node") != "agent" or not message.content:
+                continue
+            if isinstance(message, AIMessageChunk):
+                streamed_steps.add(metadata.get("langgraph_step"))
+                yield {"type": "token", "content": message.content}
+            elif isinstance(message, AIMessage) and metadata.get("langgraph_step") not in streamed_steps:
+                # 命中 LLM 缓存或模型不支持流式时，只会得到一条完整消息
+                yield {"type": "token", "content": message.content}
+        elif mode == "custom":
+            yield chunk
+        elif mode == "values":
+            final_state = chunk
+    yield {"type": "done", "state": final_state}
@@ -0,0 +1,175 @@
+import os
+import re
+import json
+import time
+import asyncio
+import argparse
+from langchain_core.messages import HumanMessage, SystemMessage
+from src.config import settings
+from src.agent import create_async_agent
+from src.file_writer import OUTPUT_DIRECTORY, output_directory
+from src.mcp_client import shutdown_search_client
+
+# 无交互批量模式：从 JSONL 读取多个需求，用有界并发的 worker 池逐个跑完整 Agent 图
+#   python -m src.batch specs.jsonl --concurrency 4
+#
+# 输入每行一个 JSON：{"id": "user-service", "prompt": "做一个用户服务 ..."}（id 可省略，默认按行号生成）
+# - 每个任务有独立的对话状态，生成的文件写到 output/<id>/ 下（通过 contextvar 隔离，互不覆盖）
+# - 每个任务结束后向报告文件追加一行：状态、耗时、最终回复、生成的文件或错误信息
+# - 中断后重新运行同一命令会跳过报告中已成功的任务
+
+os.environ["LANGCHAIN_TRACING_V2"] = "true" if settings.LANGCHAIN_TRACING_V2 else "false"
+os.environ["LANGCHAIN_API_KEY"] = settings.LANGCHAIN_API_KEY
+os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
+
+_UNSAFE_ID_PATTERN = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def load_jobs(path: str) -> list[dict]:
+    """读取任务列表，返回 [{"id", "prompt"}]"""
+    jobs, seen = [], set()
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            spec = json.loads(line)
+            prompt = spec["prompt"].strip() if isinstance(spec, dict) else str(spec)
+            raw_id = spec.get("id") if isinstance(spec, dict) else None
+            # id 同时用作输出子目录名，只保留安全字符
+            job_id = _UNSAFE_ID_PATTERN.sub("-", str(raw_id or f"job-{lineno:04d}")).strip(".-")
+            if not job_id or job_id in seen:
+                raise ValueError(f"第 {lineno} 行的任务 id 为空或重复：{raw_id!r}")
+            seen.add(job_id)
+            jobs.append({"id": job_id, "prompt": prompt})
+    return jobs
+
+
+def load_completed(report_path: str) -> set[str]:
+    """从已有报告中读出成功完成的任务 id，用于断点续跑"""
+    completed = set()
+    try:
+        with open(report_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 中断时可能留下半行，忽略
+                    continue
+                if record.get("status") == "ok":
+                    completed.add(record["id"])
+    except OSError:
+        pass
+    return completed
+
+
+def _list_files(directory: str) -> list[str]:
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if not name.startswith("."):
+                files.append(os.path.relpath(os.path.join(root, name), directory))
+    return sorted(files)
+
+
+class BatchRunner:
+    def __init__(self, agent_app, system_prompt: str, report_path: str, concurrency: int, timeout: float):
+        self.agent_app = agent_app
+        self.system_prompt = system_prompt
+        self.report_path = report_path
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self._report = None
+
+    def _write_record(self, record: dict):
+        # 单线程事件循环中顺序写入，每行立即落盘，中断后报告依然完整
+        self._report.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._report.flush()
+
+    async def _run_job(self, job: dict) -> dict:
+        job_dir = os.path.join(OUTPUT_DIRECTORY, job["id"])
+        messages = [SystemMessage(content=self.system_prompt), HumanMessage(content=job["prompt"])]
+        started_at = time.time()
+        start = time.perf_counter()
+        record = {"id": job["id"], "output_dir": job_dir, "started_at": round(started_at, 3)}
+        try:
+            # 本任务内所有工具调用的写入都落在 output/<id>/ 下
+            with output_directory(job_dir):
+                state = await asyncio.wait_for(
+                    self.agent_app.ainvoke({"messages": messages}, config={"recursion_limit": 50}),
+                    timeout=self.timeout
+                )
+            record.update(status="ok", final=state["messages"][-1].content)
+        except asyncio.TimeoutError:
+            record.update(status="error", error=f"timed out after {self.timeout:.0f}s")
+        except Exception as e:
+            record.update(status="error", error=f"{type(e).__name__}: {str(e)}")
+        record["duration_s"] = round(time.perf_counter() - start, 3)
+        record["files"] = _list_files(job_dir)
+        return record
+
+    async def run(self, jobs: list[dict]) -> dict:
+        queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+        counts = {"ok": 0, "error": 0}
+
+        async def _worker():
+            while True:
+                try:
+                    job = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                print(f"▶️  [{job['id']}] started")
+                record = await self._run_job(job)
+                self._write_record(record)
+                counts[record["status"]] += 1
+                mark = "✅" if record["status"] == "ok" else "❌"
+                print(f"{mark} [{job['id']}] {record['status']} in {record['duration_s']:.1f}s "
+                      f"({len(record['files'])} files) | {counts['ok'] + counts['error']}/{len(jobs)} done")
+
+        start = time.perf_counter()
+        with open(self.report_path, "a", encoding="utf-8") as self._report:
+            await asyncio.gather(*[_worker() for _ in range(min(self.concurrency, len(jobs)))])
+        elapsed = time.perf_counter() - start
+        return {
+            **counts,
+            "elapsed_s": round(elapsed, 1),
+            "jobs_per_min": round(len(jobs) / elapsed * 60, 2) if jobs and elapsed else 0.0,
+        }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="DevMate 批量模式")
+    parser.add_argument("jobs", help="任务 JSONL 文件，每行 {\"id\": ..., \"prompt\": ...}")
+    parser.add_argument("--report", help="报告 JSONL 路径，默认 <jobs>.report.jsonl")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY, help="同时运行的任务数")
+    parser.add_argument("--timeout", type=float, default=settings.BATCH_JOB_TIMEOUT, help="单个任务超时（秒）")
+    parser.add_argument("--rerun", action="store_true", help="忽略报告中已完成的任务，全部重跑")
+    args = parser.parse_args()
+
+    report_path = args.report or os.path.splitext(args.jobs)[0] + ".report.jsonl"
+    jobs = load_jobs(args.jobs)
+    completed = set() if args.rerun else load_completed(report_path)
+    pending = [job for job in jobs if job["id"] not in completed]
+    print(f"🤖 DevMate batch: {len(jobs)} jobs, {len(jobs) - len(pending)} already done, "
+          f"concurrency {args.concurrency}")
+    if not pending:
+        return
+
+    # 只编译一次 Agent 图，所有任务共享（对话状态各自独立）
+    agent_app, system_prompt = create_async_agent()
+    runner = BatchRunner(agent_app, system_prompt, report_path, args.concurrency, args.timeout)
+    try:
+        summary = await runner.run(pending)
+    finally:
+        await asyncio.to_thread(shutdown_search_client)
+    print(f"📊 {summary['ok']} ok, {summary['error']} failed in {summary['elapsed_s']}s "
+          f"({summary['jobs_per_min']} jobs/min). Report: {report_path}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nInterrupted. Re-run the same command to resume.")
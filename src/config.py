@@ -7,11 +7,80 @@ class Settings(BaseSettings):
     API_KEY: str
     MODEL_NAME: str = "gpt-4o-mini"
     EMBEDDING_MODEL_NAME: str = "text-embedding-3-small"
+    # Embedding 后端：openai（远程）/ hashing（本地 CPU 特征哈希）/ sentence-transformers（本地模型，可选依赖）
+    EMBEDDING_BACKEND: str = "openai"
+    LOCAL_EMBEDDING_MODEL: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    HASHING_EMBEDDING_DIM: int = 1024
+
+    # RAG Settings
+    VECTOR_STORE: str = "chroma"    # chroma / numpy（内存映射矩阵，适合小语料，冷启动更快）
+    RAG_CACHE_SIZE: int = 256       # 查询向量/检索结果缓存条数上限
+    RAG_CACHE_TTL: float = 600.0    # 缓存有效期（秒）
+    RAG_RETRIEVAL_MODE: str = "hybrid"  # hybrid（BM25 + 向量，RRF 融合）/ vector / lexical
+    RAG_HYBRID_CANDIDATES: int = 8      # 混合检索时每一路取的候选数
+    RAG_HYBRID_RRF_K: int = 60          # RRF 平滑常数（标准值 60）
+    RAG_HYBRID_VECTOR_WEIGHT: float = 1.0  # RRF 中向量一路的权重（BM25 一路为 1.0）；调整前请用真实 Embedding 评估
+    EMBED_BATCH_SIZE: int = 64          # 每个 Embedding 批次的最大切片数
+    EMBED_BATCH_MAX_TOKENS: int = 8000  # 每个 Embedding 批次的最大 token 数（估算）
+    EMBED_CONCURRENCY: int = 4          # 同时在途的 Embedding 批次数
+    EMBED_MAX_RETRIES: int = 5          # 限流/服务端错误的最大重试次数（由 LLM 网关执行）
+
+    # Agent Settings
+    TOOL_MAX_CONCURRENCY: int = 8   # 同一轮中并发执行的工具调用上限
+    TOOL_TIMEOUT: float = 120.0     # 单轮工具执行超时（秒）
+    STREAM_OUTPUT: bool = True      # CLI 是否流式打印 token 与工具调用进度
+    RULES_GLOBAL_ALLOW: list[str] = ["app", "router", "templates", "logger"]  # 全局变量前缀规则的豁免名单（框架约定的全局对象）
+    PREFETCH_RULES: bool = False    # 每轮开始时先用用户消息检索内部规范并注入上下文，省去一次"先查规范"的模型调用
+    CONTEXT_TOKEN_BUDGET: int = 24000           # 发送给模型的历史消息 token 预算（估算）
+    CONTEXT_KEEP_TURNS: int = 2                 # 最近几轮对话保持原样不压缩
+    CONTEXT_TOOL_RESULT_MAX_TOKENS: int = 400   # 旧轮次中单条工具结果保留的 token 数
+    CONTEXT_LOG_TOKENS: bool = True             # 每轮第一次调用模型前记录 prompt token 数（logging INFO，logger "src.agent"）
+    CONTEXT_PACK_DOCS_MAX_TOKENS: int = 1500    # search_local_docs 单次结果的 token 上限（合并重叠切片后）
+    CONTEXT_PACK_SEARCH_MAX_TOKENS: int = 1500  # 搜索工具单次结果的 token 上限（近似重复去重后）
+
+    # LLM Gateway（进程级限速、自适应并发与重试；0 表示不限）
+    LLM_RPM: int = 500                      # 对话模型每分钟请求数上限
+    LLM_TPM: int = 200000                   # 对话模型每分钟 token 数上限
+    LLM_MAX_CONCURRENCY: int = 16           # 自适应并发的上限
+    LLM_MAX_RETRIES: int = 6                # 429/5xx 的最大重试次数
+    LLM_EXPECTED_COMPLETION_TOKENS: int = 1024  # 限速时为每次调用预留的输出 token
+    EMBED_RPM: int = 3000
+    EMBED_TPM: int = 1000000
+
+    # LLM Response Cache（可选，回放/回归测试时开启）
+    LLM_CACHE_ENABLED: bool = False
+    LLM_CACHE_PATH: str = ".cache/llm_cache.sqlite3"
+    LLM_CACHE_TTL: float = 7 * 86400.0
+    LLM_CACHE_MAX_ENTRIES: int = 2000
+    LLM_CACHE_MAX_BYTES: int = 200 * 1024 * 1024
+
+    # Server Mode Settings (python -m src.server)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8080
+    SERVER_MAX_CONCURRENT_RUNS: int = 8     # 同时执行的 Agent 运行数
+    SERVER_MAX_QUEUE: int = 32              # 排队等待的请求数上限，超出返回 429
+    SERVER_SESSION_TTL: float = 3600.0      # 会话闲置多久后被清理（秒）
+
+    # Batch Mode Settings (python -m src.batch)
+    BATCH_CONCURRENCY: int = 4              # 同时运行的任务数（受模型服务商限流约束）
+    BATCH_JOB_TIMEOUT: float = 900.0        # 单个任务超时（秒）
 
     # Search Tool Settings
     TAVILY_API_KEY: str
+    MCP_SERVER_SCRIPT: str = "src/search_server.py"   # 相对项目根目录
+    MCP_POOL_SIZE: int = 1          # 常驻 search server 会话数量
+    MCP_CALL_TIMEOUT: float = 60.0  # 单次 MCP 工具调用超时（秒）
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_PATH: str = ".cache/search_cache.sqlite3"
+    SEARCH_CACHE_TTL: float = 86400.0                 # 搜索结果缓存有效期（秒），默认一天
+    SEARCH_CACHE_MAX_ENTRIES: int = 5000
+    SEARCH_CACHE_MAX_BYTES: int = 50 * 1024 * 1024    # 缓存文件内容总大小上限
+    SEARCH_BATCH_CONCURRENCY: int = 4   # search_web_batch 同时进行的查询数
+    SEARCH_BATCH_MAX_QUERIES: int = 8   # search_web_batch 单次最多查询数
 
     # Observability
+    METRICS_ENABLED: bool = False                  # 本地埋点（span JSONL + Prometheus 指标）
+    METRICS_FILE: str = ".cache/metrics.jsonl"     # span 输出文件，留空则只保留进程内指标
     LANGCHAIN_TRACING_V2: bool = False
     LANGCHAIN_API_KEY: str = ""
     LANGCHAIN_PROJECT: str = "devmate-project"
@@ -0,0 +1,119 @@
+import json
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, ToolMessage
+from src.tokens import estimate_tokens
+
+# 对话上下文压缩
+# 多轮对话中历史消息会原样带入下一轮，其中 write_file 的完整文件内容、原始搜索结果占了大头。
+# 在每次调用模型前执行：
+#   1. System Prompt 与最近 keep_turns 轮对话保持原样
+#   2. 更早的轮次中：工具调用里的大段参数（如文件内容）替换为摘要，过长的工具结果截断
+#   3. 仍超出预算时，从最早的轮次开始整轮丢弃
+# 返回的更新消息与原消息 id 相同，会被 add_messages 原位替换。
+
+# 单个工具参数超过此长度（字符）时视为"大段内容"
+_LARGE_ARG_CHARS = 500
+
+
+def message_tokens(message) -> int:
+    """估算单条消息的 token 数（含工具调用参数）"""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+    tokens = estimate_tokens(content) + 4
+    for call in getattr(message, "tool_calls", None) or []:
+        tokens += estimate_tokens(call["name"]) + estimate_tokens(json.dumps(call["args"], ensure_ascii=False))
+    return tokens
+
+
+def count_tokens(messages) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+def _format_size(n: int) -> str:
+    return f"{n / 1024:.1f} KB" if n >= 1024 else f"{n} B"
+
+
+def _shrink_args(args: dict) -> dict:
+    """把工具调用中的大段参数替换为一行摘要"""
+    shrunk = {}
+    for key, value in args.items():
+        if isinstance(value, list):
+            # write_files 的 files 列表：逐项压缩每个文件的内容
+            shrunk[key] = [_shrink_args(item) if isinstance(item, dict) else item for item in value]
+        elif isinstance(value, str) and len(value) > _LARGE_ARG_CHARS:
+            size = _format_size(len(value.encode("utf-8")))
+            if "file_path" in args:
+                shrunk[key] = f"<wrote {args['file_path']} ({size}), content omitted>"
+            else:
+                shrunk[key] = f"<{size} omitted>"
+        else:
+            shrunk[key] = value
+    return shrunk
+
+
+def _shrink_message(message, max_result_tokens: int):
+    """压缩一条旧消息，无需改动时返回 None"""
+    if isinstance(message, AIMessage) and message.tool_calls:
+        calls = [{**call, "args": _shrink_args(call["args"])} for call in message.tool_calls]
+        if calls == message.tool_calls:
+            return None
+        # additional_kwargs 中保存着原始的函数调用参数 JSON，一并去掉，发送时以 tool_calls 为准
+        kwargs = {k: v for k, v in message.additional_kwargs.items() if k != "tool_calls"}
+        return message.model_copy(update={"tool_calls": calls, "additional_kwargs": kwargs})
+
+    if isinstance(message, ToolMessage) and isinstance(message.content, str):
+        if estimate_tokens(message.content) <= max_result_tokens:
+            return None
+        # 按 token 预算粗略换算保留的字符数
+        keep_chars = max(200, max_result_tokens * len(message.content) // max(estimate_tokens(message.content), 1))
+        omitted = len(message.content) - keep_chars
+        content = f"{message.content[:keep_chars]}\n...[truncated {omitted} chars from an earlier turn]"
+        return message.model_copy(update={"content": content})
+
+    return None
+
+
+def _split_turns(messages):
+    """拆分为 (开头的系统消息, [每一轮的消息列表])，每轮以 HumanMessage 开始"""
+    head, turns = [], []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            turns.append([message])
+        elif turns:
+            turns[-1].append(message)
+        else:
+            head.append(message)
+    return head, turns
+
+
+def compact_messages(messages, budget: int, keep_turns: int = 2, max_result_tokens: int = 400):
+    """
+    计算压缩后的消息更新。
+    :return: (updates, 压缩前 token 数, 压缩后 token 数)；updates 可直接作为 MessagesState 的增量返回
+    """
+    before = count_tokens(messages)
+    if before <= budget:
+        return [], before, before
+
+    _, turns = _split_turns(messages)
+    old_turns = turns[:-keep_turns] if keep_turns > 0 else turns
+    updates = []
+    after = before
+
+    # 1. 压缩旧轮次中的大段工具参数与工具结果
+    for turn in old_turns:
+        for i, message in enumerate(turn):
+            shrunk = _shrink_message(message, max_result_tokens)
+            if shrunk is not None:
+                after += message_tokens(shrunk) - message_tokens(message)
+                turn[i] = shrunk
+                updates.append(shrunk)
+
+    # 2. 仍超出预算：从最早的轮次开始整轮丢弃（保留开头的 System Prompt）
+    replaced = {m.id: m for m in updates}
+    for turn in old_turns:
+        if after <= budget:
+            break
+        for message in turn:
+            after -= message_tokens(message)
+            replaced[message.id] = RemoveMessage(id=message.id)
+
+    return list(replaced.values()), before, after
@@ -0,0 +1,151 @@
+import logging
+from src.lexical_index import tokenize
+from src.metrics import incr
+from src.tokens import estimate_tokens
+
+# 工具结果的上下文打包（search_local_docs 与 MCP 搜索服务共用）
+# 工具结果会进入本轮之后的每一次模型调用，重复的字节会被反复计费：
+#   - 文档切片：ingest 时 chunk_overlap=200，相邻命中的切片有大段重复文本。
+#     按 ingest 时记录的 start_index 把同一文件中重叠/相邻的切片拼回连续的段落
+#   - 搜索结果：不同网站转载的同一段内容按 token shingle 的 Jaccard 相似度去重
+#   - 最后按 token 预算截断，保留来源/标题等元数据
+# 每个函数都返回打包前后的 token 数，调用方据此记录节省量。
+
+logger = logging.getLogger(__name__)
+
+# 相邻切片之间允许的空白间隔（切分时去掉了首尾空白）
+_ADJACENT_GAP = 2
+# 两段文本的 shingle Jaccard 相似度超过此值视为近似重复
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# 剩余预算小于此值时不再追加被截断的片段
+_MIN_SECTION_TOKENS = 40
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    tokens = estimate_tokens(text)
+    if tokens <= budget:
+        return text
+    keep_chars = max(0, budget * len(text) // max(tokens, 1))
+    return text[:keep_chars].rstrip() + "\n...[truncated]"
+
+
+def _overlap_matches(merged: str, text: str, overlap: int) -> bool:
+    """按偏移推算的重叠部分必须与文本实际一致，偏移过期时不按偏移拼接"""
+    if overlap <= 0:
+        return True
+    if overlap >= len(text):
+        return text in merged
+    return merged.endswith(text[:overlap])
+
+
+def merge_chunks(docs) -> list[dict]:
+    """
+    把同一来源中重叠或相邻的切片合并为连续段落，保持按最佳排名排序。
+    没有 start_index 的旧切片只做完全重复的去重。
+    :return: [{"source", "header", "text", "rank"}]
+    """
+    by_source: dict[str, list] = {}
+    for rank, doc in enumerate(docs):
+        by_source.setdefault(doc.metadata.get("source", ""), []).append((rank, doc))
+
+    sections = []
+    for source, items in by_source.items():
+        items.sort(key=lambda item: (item[1].metadata.get("start_index") is None, item[1].metadata.get("start_index") or 0))
+        spans = []
+        for rank, doc in items:
+            text = doc.page_content
+            start = doc.metadata.get("start_index")
+            last = spans[-1] if spans else None
+            if start is not None and last is not None and last["end"] is not None \
+                    and start <= last["end"] + _ADJACENT_GAP and _overlap_matches(last["text"], text, last["end"] - start):
+                if start < last["end"]:
+                    text = text[last["end"] - start:]
+                elif start > last["end"]:
+                    text = "\n" + text
+                last["text"] += text
+                last["end"] = max(last["end"], start + len(doc.page_content))
+                last["rank"] = min(last["rank"], rank)
+                continue
+            if any(text in span["text"] for span in spans):
+                continue
+            spans.append({
+                "source": source,
+                "header": doc.metadata.get("header", ""),
+                "text": text,
+                "end": start + len(text) if start is not None else None,
+                "rank": rank,
+            })
+        sections.extend(spans)
+
+    sections.sort(key=lambda section: section["rank"])
+    return sections
+
+
+def pack_documents(docs, budget: int) -> tuple[str, int, int]:
+    """
+    打包检索到的文档切片。
+    :return: (打包后的文本, 打包前 token 数, 打包后 token 数)
+    """
+    before = sum(estimate_tokens(doc.page_content) for doc in docs)
+    blocks, remaining = [], budget
+    for section in merge_chunks(docs):
+        label = section["source"] + (f" § {section['header']}" if section["header"] else "")
+        block = f"[文档片段] {label}:\n{section['text']}"
+        tokens = estimate_tokens(block)
+        if tokens > remaining:
+            if remaining >= _MIN_SECTION_TOKENS:
+                blocks.append(truncate_to_tokens(block, remaining))
+            break
+        blocks.append(block)
+        remaining -= tokens
+    text = "\n\n".join(blocks)
+    return text, before, estimate_tokens(text)
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    tokens = tokenize(text)
+    if not tokens:
+        # 空内容不参与去重（否则所有空结果都会互相判为重复）
+        return set()
+    if len(tokens) <= size:
+        return {tuple(tokens)}
+    return {tuple(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def pack_search_results(results: list[dict], budget: int) -> tuple[list[dict], int, int]:
+    """
+    对已排序的搜索结果去掉近似重复的内容，并按 token 预算截断 content。
+    :return: (保留的结果, 打包前 content token 数, 打包后 content token 数)
+    """
+    before = sum(estimate_tokens(r["content"]) for r in results)
+    kept, kept_shingles, remaining = [], [], budget
+    for result in results:
+        shingles = _shingles(result["content"])
+        if any(_jaccard(shingles, other) >= NEAR_DUPLICATE_THRESHOLD for other in kept_shingles):
+            continue
+        overhead = estimate_tokens(result["title"]) + 20
+        tokens = estimate_tokens(result["content"]) + overhead
+        if tokens > remaining:
+            # 标题等开销占掉预算后剩下的正文太少时直接丢弃，不输出只有截断标记的空条目
+            content_budget = remaining - overhead
+            if content_budget >= _MIN_SECTION_TOKENS:
+                kept.append({**result, "content": truncate_to_tokens(result["content"], content_budget)})
+            break
+        kept.append(result)
+        kept_shingles.append(shingles)
+        remaining -= tokens
+    after = sum(estimate_tokens(r["content"]) for r in kept)
+    return kept, before, after
+
+
+def report_savings(tool: str, before: int, after: int):
+    """记录一次打包节省的 token 数（指标 + DEBUG 日志，不写 stdout）"""
+    saved = max(0, before - after)
+    incr("devmate_context_pack_tokens_saved_total", saved, tool=tool)
+    logger.debug("%s: %d -> %d tokens (saved %d)", tool, before, after, saved)
@@ -0,0 +1,131 @@
+import zlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from src.config import settings
+from src.lexical_index import tokenize
+from src.llm_gateway import get_gateway
+from src.tokens import estimate_tokens
+
+# 可插拔的 Embedding 后端（EMBEDDING_BACKEND）：
+#   - openai：远程 OpenAIEmbeddings（默认，使用 EMBEDDING_MODEL_NAME）
+#   - hashing：进程内 CPU 特征哈希，无模型文件、无网络，NumPy 向量化批量计算
+#   - sentence-transformers：本地小型句向量模型（可选依赖，LOCAL_EMBEDDING_MODEL）
+# 指纹写入摄入清单，切换后端/模型后 ingest_docs 会自动全量重建索引。
+
+# 特征哈希算法变更时递增，使旧索引失效
+_HASHING_VERSION = 1
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    特征哈希 Embedding：与 BM25 相同的分词（标识符 + 下划线子词 + 中文 bigram），
+    每个 token 哈希到 dim 维中的一个带符号分量，词频做 log 压缩后 L2 归一化。
+    """
+
+    def __init__(self, dim: int = 1024, batch_size: int = 256):
+        self.dim = dim
+        self.batch_size = batch_size
+        # token -> 带符号的分量下标（+1 偏移，符号即哈希符号），避免重复计算 crc32
+        self._buckets: dict[str, int] = {}
+
+    def _bucket(self, token: str) -> int:
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            h = zlib.crc32(token.encode("utf-8"))
+            bucket = (h % self.dim + 1) * (1 if h & 0x80000000 else -1)
+            if len(self._buckets) > 500_000:
+                self._buckets.clear()
+            self._buckets[token] = bucket
+        return bucket
+
+    def _embed_batch(self, texts: list[str]) -> np.ndarray:
+        rows, buckets = [], []
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                rows.append(row)
+                buckets.append(self._bucket(token))
+        buckets = np.asarray(buckets, dtype=np.int64)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), np.abs(buckets) - 1), np.sign(buckets).astype(np.float32))
+
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[i:i + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """本地 sentence-transformers 模型，CPU 批量推理，输出已归一化"""
+
+    def __init__(self, model_name: str, batch_size: int = 64):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "EMBEDDING_BACKEND=sentence-transformers 需要安装可选依赖：uv sync --extra local-embeddings"
+            ) from e
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        ).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+class GatewayEmbeddings(Embeddings):
+    """远程 Embedding 经过进程级 LLM 网关：共享 RPM/TPM 限额、自适应并发与 429 重试"""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        tokens = sum(estimate_tokens(t) for t in texts)
+        return get_gateway("embed").call(lambda: self.embeddings.embed_documents(texts), tokens=tokens)
+
+    def embed_query(self, text: str) -> list[float]:
+        return get_gateway("embed").call(lambda: self.embeddings.embed_query(text), tokens=estimate_tokens(text))
+
+
+def build_embeddings() -> Embeddings:
+    """按 EMBEDDING_BACKEND 创建 Embedding 模型"""
+    backend = settings.EMBEDDING_BACKEND
+    if backend == "openai":
+        # 重试交给网关，客户端自身不再重试
+        return GatewayEmbeddings(OpenAIEmbeddings(
+            base_url=settings.AI_BASE_URL,
+            api_key=settings.API_KEY,
+            model=settings.EMBEDDING_MODEL_NAME,
+            max_retries=0
+        ))
+    if backend == "hashing":
+        return HashingEmbeddings(dim=settings.HASHING_EMBEDDING_DIM, batch_size=settings.EMBED_BATCH_SIZE)
+    if backend == "sentence-transformers":
+        return SentenceTransformerEmbeddings(settings.LOCAL_EMBEDDING_MODEL, batch_size=settings.EMBED_BATCH_SIZE)
+    raise ValueError(f"未知的 EMBEDDING_BACKEND: {backend}（可选 openai / hashing / sentence-transformers）")
+
+
+def embedding_fingerprint() -> str:
+    """当前 Embedding 后端与模型的指纹，不同指纹产生的向量不可混用"""
+    backend = settings.EMBEDDING_BACKEND
+    if backend == "openai":
+        return f"openai:{settings.EMBEDDING_MODEL_NAME}"
+    if backend == "hashing":
+        return f"hashing:v{_HASHING_VERSION}:{settings.HASHING_EMBEDDING_DIM}"
+    return f"{backend}:{settings.LOCAL_EMBEDDING_MODEL}"
@@ -0,0 +1,89 @@
+import os
+import hashlib
+import tempfile
+import contextlib
+import contextvars
+
+# Agent 生成文件的落盘逻辑（write_file / write_files 共用）
+#   - 所有路径都归到输出根目录（默认 output/）下，解析符号链接后仍必须位于根目录内
+#     批量模式中每个任务通过 contextvar 使用各自的子目录（output/<job_id>/）
+#   - 内容哈希与现有文件相同则跳过，重复执行同一任务不会改写文件
+#   - 先写同目录下的临时文件再 os.replace，读者不会看到写了一半的文件
+
+OUTPUT_DIRECTORY = "output"
+
+_output_root = contextvars.ContextVar("devmate_output_root", default=OUTPUT_DIRECTORY)
+
+
+def current_output_directory() -> str:
+    return _output_root.get()
+
+
+@contextlib.contextmanager
+def output_directory(path: str):
+    """在当前上下文（线程/asyncio 任务）中把输出根目录切换为 path"""
+    token = _output_root.set(path)
+    try:
+        yield
+    finally:
+        _output_root.reset(token)
+
+
+def resolve_output_path(file_path: str) -> tuple[str, str]:
+    """
+    把模型给出的路径规范化到当前输出根目录下（"main.py" 与 "output/main.py" 等价）。
+    :return: (展示用的相对路径, 实际写入的绝对路径)
+    :raises ValueError: 路径为空或解析后逃逸出输出根目录
+    """
+    root_dir = _output_root.get()
+    path = file_path.strip().removeprefix("./").removeprefix(OUTPUT_DIRECTORY + "/")
+    if not path:
+        raise ValueError("file_path 不能为空")
+    path = os.path.join(root_dir, path)
+
+    root = os.path.realpath(root_dir)
+    full_path = os.path.realpath(path)
+    if not full_path.startswith(root + os.sep):
+        raise ValueError(f"路径 '{file_path}' 不在 {root_dir}/ 目录内")
+    return os.path.normpath(path), full_path
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _unchanged(full_path: str, data: bytes, digest: str) -> bool:
+    try:
+        # 大小不同时不必读取内容
+        if os.path.getsize(full_path) != len(data):
+            return False
+        with open(full_path, "rb") as f:
+            return _sha256(f.read()) == digest
+    except OSError:
+        return False
+
+
+def write_atomic(full_path: str, content: str) -> tuple[str, str, int]:
+    """
+    原子写入单个文件。
+    :return: (状态 "written" / "unchanged", sha256, 字节数)
+    """
+    data = content.encode("utf-8")
+    digest = _sha256(data)
+    if _unchanged(full_path, data, digest):
+        return "unchanged", digest, len(data)
+
+    directory = os.path.dirname(full_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(full_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, full_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return "written", digest, len(data)
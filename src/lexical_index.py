@@ -0,0 +1,139 @@
+import os
+import re
+import json
+import math
+from collections import Counter
+
+# 本地 BM25 倒排索引
+# 内部规范里有大量精确标识符（如 dm_secret_、happiness_level），纯向量相似度容易漏掉。
+# 分词规则：
+#   - 英文/标识符：整体保留（小写），同时拆出下划线分隔的子词和以下划线结尾的前缀
+#     （dm_secret_user_count -> dm_secret_user_count, dm, secret, user, count, dm_, dm_secret_, dm_secret_user_）
+#   - 中日韩文本：字符 bigram
+# 索引只持久化切片原文与元数据，加载时重建倒排表（几千个切片以内为毫秒级）。
+
+_IDENT_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+_CJK_RUN_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]+")
+# 含下划线或被反引号包裹的标识符视为"精确查找"
+_EXACT_PATTERN = re.compile(r"`([^`\s]+)`|([A-Za-z0-9]*_[A-Za-z0-9_]*)")
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for ident in _IDENT_PATTERN.findall(text):
+        ident = ident.lower()
+        tokens.append(ident)
+        if "_" in ident:
+            tokens.extend(part for part in ident.split("_") if part)
+            tokens.extend(ident[:i + 1] for i, ch in enumerate(ident[:-1]) if ch == "_" and i > 0)
+    for run in _CJK_RUN_PATTERN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def exact_tokens(query: str) -> list[str]:
+    """提取查询中需要精确匹配的标识符"""
+    found = []
+    for quoted, ident in _EXACT_PATTERN.findall(query):
+        token = (quoted or ident).lower()
+        if token and token.strip("_"):
+            found.append(token)
+    return found
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: dict[str, dict] = {}       # chunk_id -> {"text": ..., "metadata": ...}
+        self._postings: dict[str, dict[str, int]] = {}
+        self._lengths: dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, chunk_id: str, text: str, metadata: dict):
+        if chunk_id in self.docs:
+            self.remove(chunk_id)
+        self.docs[chunk_id] = {"text": text, "metadata": metadata}
+        counts = Counter(tokenize(text))
+        for token, tf in counts.items():
+            self._postings.setdefault(token, {})[chunk_id] = tf
+        length = sum(counts.values())
+        self._lengths[chunk_id] = length
+        self._total_length += length
+
+    def remove(self, chunk_id: str):
+        doc = self.docs.pop(chunk_id, None)
+        if doc is None:
+            return
+        for token in set(tokenize(doc["text"])):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[token]
+        self._total_length -= self._lengths.pop(chunk_id, 0)
+
+    def contains(self, token: str) -> bool:
+        return token in self._postings
+
+    def search(self, query: str, k: int, required: list[str] | None = None) -> list[tuple[str, float]]:
+        """
+        BM25 打分，返回 [(chunk_id, score)]。
+        :param required: 结果必须同时包含的 token（用于精确标识符查找）
+        """
+        if not self.docs:
+            return []
+        n = len(self.docs)
+        avgdl = self._total_length / n or 1.0
+        scores: dict[str, float] = {}
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / avgdl)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        if required:
+            allowed = None
+            for token in required:
+                ids = set(self._postings.get(token, {}))
+                allowed = ids if allowed is None else allowed & ids
+            scores = {cid: score for cid, score in scores.items() if cid in allowed}
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"docs": self.docs}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        index = cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return index
+        for chunk_id, doc in data.get("docs", {}).items():
+            index.add(chunk_id, doc["text"], doc["metadata"])
+        return index
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60, weights: list[float] | None = None) -> list[str]:
+    """加权 RRF 融合多路排序结果：score = Σ weight / (k + rank)，weights 默认全为 1"""
+    weights = weights or [1.0] * len(rankings)
+    scores: dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+    return sorted(scores, key=lambda key: scores[key], reverse=True)
@@ -0,0 +1,88 @@
+import json
+import hashlib
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from src.config import settings
+from src.disk_cache import DiskCache
+
+# LLM 响应缓存（可选，默认关闭）
+# Agent 使用 temperature=0，相同的 模型 + 工具定义 + 消息列表 应得到相同的回复。
+# 回放场景、回归测试、工具失败后重试时直接命中磁盘缓存，跳过一次完整的 LLM 调用。
+
+
+def _canonical_message(message) -> dict:
+    """
+    只保留影响模型输出的字段。
+    消息 id 每次运行都会重新生成，不能参与缓存键计算。
+    """
+    data = {"type": message.type, "content": message.content}
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        data["tool_calls"] = [
+            {"name": call["name"], "args": call["args"], "id": call.get("id")} for call in tool_calls
+        ]
+    tool_call_id = getattr(message, "tool_call_id", None)
+    if tool_call_id:
+        data["tool_call_id"] = tool_call_id
+    return data
+
+
+class LLMCache:
+    def __init__(self, cache: DiskCache, model_name: str, tools):
+        self.cache = cache
+        self.model_name = model_name
+        self.tool_schemas = [convert_to_openai_tool(t) for t in tools]
+
+    def key(self, messages) -> str:
+        payload = json.dumps(
+            {
+                "model": self.model_name,
+                "tools": self.tool_schemas,
+                "messages": [_canonical_message(m) for m in messages],
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, messages):
+        """命中时返回 AIMessage，否则返回 None"""
+        data = self.cache.get(self.key(messages))
+        if data is None:
+            return None
+        response = messages_from_dict([data])[0]
+        # 让 add_messages 重新分配 id，避免与历史中的消息冲突
+        response.id = None
+        return response
+
+    def store(self, messages, response):
+        self.cache.set(self.key(messages), messages_to_dict([response])[0])
+
+
+# 进程级共享的磁盘缓存：同一进程内的多个 Agent 共用，命中统计即本次运行的统计
+_disk_cache: DiskCache | None = None
+
+
+def build_llm_cache(tools):
+    """按配置创建 LLM 缓存；未启用时返回 None"""
+    global _disk_cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    if _disk_cache is None:
+        _disk_cache = DiskCache(
+            settings.LLM_CACHE_PATH,
+            ttl=settings.LLM_CACHE_TTL,
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            max_bytes=settings.LLM_CACHE_MAX_BYTES
+        )
+    return LLMCache(_disk_cache, settings.MODEL_NAME, tools)
+
+
+def cache_report():
+    """本次运行的 LLM 缓存命中报告；未启用时返回 None"""
+    if _disk_cache is None:
+        return None
+    stats = _disk_cache.stats()
+    return (f"LLM cache: {stats['hits']} hits / {stats['misses']} misses "
+            f"(hit rate {stats['hit_rate']:.0%}, {stats['entries']} entries on disk)")
@@ -0,0 +1,276 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from src.config import settings
+from src.metrics import incr, observe
+
+# 进程级 LLM / Embedding 调用网关
+# 所有 call_model 与远程 Embedding 调用都经过这里，多个并发运行（服务模式、批量模式）共享同一组限额：
+#   1. 令牌桶：按每分钟请求数（RPM）和每分钟 token 数（TPM）限速，超出时排队等待而不是撞上 429
+#   2. 自适应并发（AIMD）：成功时并发上限缓慢加 1，遇到 429/5xx 时减半
+#   3. 重试：带抖动的指数退避，服务端给出 Retry-After 时按其等待
+#   4. 指标：排队等待时间、限流次数、重试次数、当前并发上限
+# 客户端自身的重试需关闭（ChatOpenAI / OpenAIEmbeddings 的 max_retries=0），避免重试次数相乘。
+# 重试日志走标准 logging（logger "src.llm_gateway"，INFO 级别），默认不输出到终端。
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    令牌桶（允许欠账）：reserve() 立即扣除，返回需要等待的秒数。
+    先到的调用先扣，后到的调用等待时间更长，高并发下仍保持先来先服务。
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, amount: float):
+        """调用完成后按实际用量修正（正数补扣，负数退还）"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD 并发控制：成功 +1/limit（约每轮 +1），失败减半，范围 [1, max_limit]。
+    异步等待者按到达顺序排队（FIFO），槽位空出时直接移交给队首，不轮询；
+    同步等待者在异步队列清空后才能拿到槽位，避免插队。
+    """
+
+    def __init__(self, initial: int, max_limit: int):
+        self.max_limit = max(1, max_limit)
+        self.limit = float(min(max(1, initial), self.max_limit))
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        # (事件循环, future)：future 完成即表示槽位已经移交（in_flight 已计入）
+        self._waiters = deque()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit) or self._waiters:
+                self._cond.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._cond:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # 槽位已经移交：future 已有结果时在这里归还，否则由 _resolve 归还
+            if waiter[1].done() and not waiter[1].cancelled():
+                self.release()
+            raise
+
+    def _grant(self):
+        """持有 _cond 时调用：把空出的槽位按顺序移交给异步等待者"""
+        while self._waiters and self.in_flight < int(self.limit):
+            loop, future = self._waiters.popleft()
+            self.in_flight += 1
+            loop.call_soon_threadsafe(self._resolve, future)
+
+    def _resolve(self, future):
+        if future.cancelled():
+            self.release()
+        elif not future.done():
+            future.set_result(None)
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._grant()
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._grant()
+            self._cond.notify_all()
+
+    def on_overload(self):
+        with self._cond:
+            self.limit = max(1.0, self.limit / 2)
+
+
+def is_retryable(error: Exception) -> bool:
+    """限流 (429) 与服务端错误 (5xx)、超时/连接错误值得退避重试，其余错误直接抛出"""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    name = type(error).__name__
+    return name in ("RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError")
+
+
+def _status_code(error: Exception):
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+
+def _retry_after(error: Exception):
+    """从响应头读取服务端建议的等待时间（秒），没有时返回 None"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    def __init__(self, kind: str, rpm: int, tpm: int, max_concurrency: int, max_retries: int):
+        self.kind = kind
+        self.max_retries = max_retries
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        # 从配置的上限起步：上限本身就是允许的最大并发，遇到 429/5xx 时再减半
+        self.limiter = AdaptiveLimiter(initial=max_concurrency, max_limit=max_concurrency)
+
+    def _reserve(self, tokens: int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            # 在服务端给出的时间上加少量抖动，避免所有等待者同时醒来
+            return retry_after + random.uniform(0, 0.5)
+        return random.uniform(0, min(30.0, 2 ** attempt))
+
+    def _on_error(self, attempt: int, error: Exception) -> float:
+        """记录一次失败，返回重试前的等待秒数；不可重试或次数用尽时重新抛出"""
+        if attempt >= self.max_retries or not is_retryable(error):
+            incr("devmate_llm_gateway_failures_total", kind=self.kind)
+            logger.warning("%s call failed after %d attempt(s): %s", self.kind, attempt + 1, type(error).__name__)
+            raise error
+        status = _status_code(error)
+        if status == 429 or (status is not None and status >= 500) or type(error).__name__ == "RateLimitError":
+            self.limiter.on_overload()
+            incr("devmate_llm_gateway_throttled_total", kind=self.kind)
+        incr("devmate_llm_gateway_retries_total", kind=self.kind)
+        delay = self._backoff(attempt, error)
+        logger.info(
+            "%s call failed (%s), retrying in %.1fs (concurrency limit %d)",
+            self.kind, type(error).__name__, delay, int(self.limiter.limit)
+        )
+        return delay
+
+    def _on_success(self, tokens: int, used_tokens: int | None):
+        self.limiter.on_success()
+        if used_tokens is not None:
+            self.tokens.adjust(used_tokens - tokens)
+
+    def _record_wait(self, waited: float):
+        observe("devmate_llm_gateway_queue_wait_seconds", waited, kind=self.kind)
+
+    def call(self, fn, tokens: int = 0, usage=None):
+        """
+        同步调用 fn()，受限速、并发与重试控制。
+        :param tokens: 本次调用预估的 token 数（用于 TPM 限速）
+        :param usage: 可选，从返回值中取实际 token 用量的函数，用于修正 TPM 计数
+        """
+        for attempt in range(self.max_retries + 1):
+            queued = time.monotonic()
+            time.sleep(self._reserve(tokens))
+            self.limiter.acquire()
+            self._record_wait(time.monotonic() - queued)
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._on_error(attempt, e)
+            else:
+                self._on_success(tokens, usage(result) if usage else None)
+                return result
+            finally:
+                self.limiter.release()
+            time.sleep(delay)
+
+    async def acall(self, fn, tokens: int = 0, usage=None):
+        """异步版本：fn 返回 awaitable；等待期间不阻塞事件循环"""
+        for attempt in range(self.max_retries + 1):
+            queued = time.monotonic()
+            await asyncio.sleep(self._reserve(tokens))
+            await self.limiter.acquire_async()
+            self._record_wait(time.monotonic() - queued)
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._on_error(attempt, e)
+            else:
+                self._on_success(tokens, usage(result) if usage else None)
+                return result
+            finally:
+                self.limiter.release()
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+        }
+
+
+# 进程级单例：对话模型与 Embedding 模型分别限额
+_gateways: dict[str, LLMGateway] = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(kind: str = "chat") -> LLMGateway:
+    with _gateways_lock:
+        gateway = _gateways.get(kind)
+        if gateway is None:
+            if kind == "embed":
+                gateway = LLMGateway(
+                    "embed", settings.EMBED_RPM, settings.EMBED_TPM,
+                    settings.EMBED_CONCURRENCY, settings.EMBED_MAX_RETRIES
+                )
+            else:
+                gateway = LLMGateway(
+                    "chat", settings.LLM_RPM, settings.LLM_TPM,
+                    settings.LLM_MAX_CONCURRENCY, settings.LLM_MAX_RETRIES
+                )
+            _gateways[kind] = gateway
+        return gateway
+
+
+def response_tokens(response) -> int | None:
+    """从 AIMessage 的 usage_metadata 中取实际总 token 数"""
+    usage = getattr(response, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
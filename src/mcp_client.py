@@ -0,0 +1,286 @@
+import os
+import sys
+import asyncio
+import atexit
+import threading
+from typing import TYPE_CHECKING
+from src.config import settings
+
+if TYPE_CHECKING:
+    from mcp import ClientSession, StdioServerParameters
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 长连接 MCP 客户端管理器
+# 旧实现每次 search_web 都会启动一个新的 search_server.py 子进程、完成握手后再销毁，
+# 解释器启动 + 依赖导入的开销远大于一次 Tavily 请求本身。
+# 这里改为：在后台线程中维护一个常驻事件循环，启动一次（或一个小池子的）MCP 会话并复用。
+
+
+class _WatchedReadStream:
+    """
+    包装 stdio_client 返回的读流：server 子进程退出后 stdout 读到 EOF、读流结束，
+    此时调用 on_close，让槽位立即标记为失效。其余属性全部委托给原始流。
+    """
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    async def __aenter__(self):
+        await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._on_close()
+        return await self._stream.__aexit__(*exc_info)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._stream.__anext__()
+        except StopAsyncIteration:
+            self._on_close()
+            raise
+
+    async def receive(self):
+        import anyio
+        try:
+            return await self._stream.receive()
+        except (anyio.EndOfStream, anyio.ClosedResourceError):
+            self._on_close()
+            raise
+
+
+class _SessionSlot:
+    """
+    连接池中的一个槽位，持有一个已初始化的 ClientSession。
+    stdio_client / ClientSession 都是 async context manager，必须在同一个 Task 中进入和退出，
+    所以每个槽位用一个常驻 Task 托管会话的完整生命周期。
+    """
+
+    def __init__(self, server_params: "StdioServerParameters"):
+        self.server_params = server_params
+        self.session: "ClientSession | None" = None
+        self._task: asyncio.Task | None = None
+        self._ready: asyncio.Event | None = None
+        self._stop: asyncio.Event | None = None
+        self._error: BaseException | None = None
+        self._lost = False
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self.session is not None and not self._lost
+            and self._task is not None and not self._task.done()
+        )
+
+    def mark_lost(self):
+        """
+        标记会话失效（子进程退出、读流关闭或调用超时），下次取用时由 _acquire 重启。
+        这里不直接关闭会话：ClientSession 需要先把 CONNECTION_CLOSED 错误发给在途请求。
+        """
+        self._lost = True
+
+    async def start(self):
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._error = None
+        self._lost = False
+        self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        if self.session is None:
+            raise RuntimeError(f"MCP server failed to start: {self._error}")
+
+    async def _run(self):
+        # mcp 客户端依赖在第一次建立会话时才导入
+        from mcp import ClientSession
+        from mcp.client.stdio import stdio_client
+        try:
+            async with stdio_client(self.server_params) as (read, write):
+                read = _WatchedReadStream(read, self.mark_lost)
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._stop.wait()
+        except Exception as e:
+            self._error = e
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=5)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+        self._task = None
+        self.session = None
+
+
+class MCPSearchClient:
+    """
+    devmate-search 服务的常驻客户端。
+    - 首次调用时启动 pool_size 个 server 子进程，之后复用已初始化的会话
+    - 会话断开/子进程退出时自动重启并重试一次；超时与工具错误直接抛出
+    - close() 时统一关闭所有会话（main.py 退出时通过 atexit 调用）
+    同步调用方（LangChain 工具）使用 call_tool，已有事件循环的调用方使用 acall_tool。
+    """
+
+    def __init__(self, pool_size: int = 1, call_timeout: float = 60.0):
+        self.pool_size = max(1, pool_size)
+        self.call_timeout = call_timeout
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._slots: list[_SessionSlot] = []
+        self._idle: asyncio.Queue | None = None
+        self._lock = threading.Lock()
+
+    def _server_params(self) -> "StdioServerParameters":
+        from mcp import StdioServerParameters
+        # 设置环境变量以确保子进程能找到 src（与当前工作目录无关）
+        env = os.environ.copy()
+        env["PYTHONPATH"] = PROJECT_ROOT
+        return StdioServerParameters(
+            command=sys.executable,
+            args=[os.path.join(PROJECT_ROOT, settings.MCP_SERVER_SCRIPT)],
+            env=env
+        )
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or not self._loop.is_running():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="mcp-client-loop", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    async def _acquire(self) -> _SessionSlot:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for _ in range(self.pool_size):
+                slot = _SessionSlot(self._server_params())
+                self._slots.append(slot)
+                self._idle.put_nowait(slot)
+        slot = await self._idle.get()
+        if not slot.alive:
+            try:
+                await slot.stop()
+                await slot.start()
+            except Exception:
+                self._idle.put_nowait(slot)
+                raise
+        return slot
+
+    @staticmethod
+    def _connection_lost(slot: _SessionSlot, error: Exception) -> bool:
+        """判断失败是否由会话断开 / 子进程退出引起（只有这类失败值得重启后重试）"""
+        import anyio
+        from mcp import McpError
+        from mcp.types import CONNECTION_CLOSED
+        if not slot.alive:
+            return True
+        # 读流结束时 ClientSession 以 CONNECTION_CLOSED 错误结束所有在途请求
+        if isinstance(error, McpError) and error.error.code == CONNECTION_CLOSED:
+            return True
+        return isinstance(error, (
+            ConnectionError, EOFError,
+            anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream
+        ))
+
+    async def _call(self, name: str, arguments: dict) -> str:
+        # 只有会话断开时才重启子进程并重试一次；
+        # 超时直接抛出（server 卡住时再等一轮只会让调用方阻塞 2 倍超时），工具自身的错误也不重试
+        for attempt in range(2):
+            slot = await self._acquire()
+            try:
+                result = await asyncio.wait_for(
+                    slot.session.call_tool(name, arguments=arguments),
+                    timeout=self.call_timeout
+                )
+                return "\n".join([c.text for c in result.content])
+            except asyncio.TimeoutError:
+                # 超时的会话状态未知：标记失效，留给下一次取用时重启，本次立即抛出
+                slot.mark_lost()
+                raise
+            except Exception as e:
+                if not self._connection_lost(slot, e):
+                    raise
+                await slot.stop()
+                if attempt == 1:
+                    raise
+            finally:
+                self._idle.put_nowait(slot)
+
+    def call_tool(self, name: str, arguments: dict) -> str:
+        """同步调用 MCP 工具（在后台事件循环上执行）"""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._call(name, arguments), loop)
+        return future.result()
+
+    async def acall_tool(self, name: str, arguments: dict) -> str:
+        """在调用方自己的事件循环中等待 MCP 工具结果"""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._call(name, arguments), loop)
+        return await asyncio.wrap_future(future)
+
+    def close(self):
+        """关闭所有会话并停止后台事件循环"""
+        with self._lock:
+            loop = self._loop
+            self._loop = None
+        if loop is None or not loop.is_running():
+            return
+
+        async def _shutdown():
+            await asyncio.gather(*[slot.stop() for slot in self._slots], return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(_shutdown(), loop).result(timeout=10)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._slots = []
+        self._idle = None
+
+
+# 进程级单例
+_search_client: MCPSearchClient | None = None
+_search_client_lock = threading.Lock()
+
+
+def get_search_client() -> MCPSearchClient:
+    """获取进程级共享的 MCP 搜索客户端（惰性创建）"""
+    global _search_client
+    with _search_client_lock:
+        if _search_client is None:
+            _search_client = MCPSearchClient(
+                pool_size=settings.MCP_POOL_SIZE,
+                call_timeout=settings.MCP_CALL_TIMEOUT
+            )
+        return _search_client
+
+
+def shutdown_search_client():
+    """关闭共享客户端（可重复调用）"""
+    global _search_client
+    with _search_client_lock:
+        client, _search_client = _search_client, None
+    if client is not None:
+        client.close()
+
+
+atexit.register(shutdown_search_client)
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import threading
+from src.config import settings
+
+# 本地埋点：不依赖 LangSmith 等外部服务，适用于内网环境
+# - span(name, **attrs)：记录一段操作的耗时与属性，写入 JSON Lines 文件（每行一个 span）
+# - incr / observe：进程内的计数器与直方图，服务模式下通过 /metrics 以 Prometheus 文本格式导出
+# 关闭时（METRICS_ENABLED=false）span 返回共享的空对象，开销只有一次函数调用。
+
+# 直方图分桶（秒）
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_counters: dict[tuple, float] = {}
+_histograms: dict[tuple, list] = {}
+_file = None
+
+
+def _labels_key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+def incr(name: str, value: float = 1, **labels):
+    """计数器加 value"""
+    if not settings.METRICS_ENABLED:
+        return
+    key = _labels_key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+    """向直方图记录一个观测值（秒）"""
+    if not settings.METRICS_ENABLED:
+        return
+    key = _labels_key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            # [各分桶计数..., 总和, 总数]
+            hist = _histograms[key] = [0] * len(_BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(_BUCKETS):
+            if value <= bound:
+                hist[i] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+def _write(record: dict):
+    global _file
+    if not settings.METRICS_FILE:
+        return
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        if _file is None:
+            directory = os.path.dirname(settings.METRICS_FILE)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            _file = open(settings.METRICS_FILE, "a", encoding="utf-8", buffering=1)
+        _file.write(line)
+
+
+class _Span:
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.error = False
+
+    def set(self, **attrs):
+        """补充属性（如 token 数、命中情况）"""
+        self.attrs.update(attrs)
+
+    def fail(self):
+        self.error = True
+
+    def __enter__(self):
+        self._ts = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        error = self.error or exc_type is not None
+        observe("devmate_span_duration_seconds", duration, span=self.name)
+        if error:
+            incr("devmate_span_errors_total", span=self.name)
+        _write({
+            "ts": round(self._ts, 6),
+            "span": self.name,
+            "duration_ms": round(duration * 1000, 3),
+            "status": "error" if error else "ok",
+            "pid": os.getpid(),
+            **self.attrs,
+        })
+        return False
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+    def fail(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    """
+    记录一段操作：
+        with span("rag.query", k=2) as s:
+            ...
+            s.set(chunks=len(results))
+    """
+    if not settings.METRICS_ENABLED:
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def _format_labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render_prometheus() -> str:
+    """以 Prometheus 文本格式导出当前进程的计数器与直方图"""
+    lines = []
+    with _lock:
+        seen = set()
+        for (name, labels), value in sorted(_counters.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), hist in sorted(_histograms.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {name} histogram")
+                seen.add(name)
+            for bound, count in zip(_BUCKETS, hist):
+                le = 'le="%s"' % bound
+                lines.append(f"{name}_bucket{_format_labels(labels, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{name}_bucket{_format_labels(labels, le)} {hist[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {hist[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {hist[-1]}")
+    return "\n".join(lines) + "\n"
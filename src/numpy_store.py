@@ -0,0 +1,175 @@
+import os
+import json
+import shutil
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# 进程内 NumPy 向量库（VECTOR_STORE=numpy），适合几百到几千个切片的小语料：
+#   - vectors.npy：所有切片向量组成的连续 float32 矩阵（已 L2 归一化），查询时以 mmap 只读打开，
+#     冷启动几乎无开销，多个服务进程共享同一份 OS 页缓存
+#   - vectors.json：与矩阵行一一对应的切片 ID、原文与元数据
+# 精确 top-k 检索就是一次矩阵-向量乘法（余弦相似度）+ argpartition。
+# 摄入期间的增删只作用于内存中的副本。flush() 把两个文件写进新的版本目录 vectors-<n>/，
+# 再用一次 os.replace 替换指针文件 vectors.current 切换版本：读方和崩溃恢复只会看到完整的一对文件。
+# 上一个版本目录保留到下一次 flush，正在按旧指针加载的读方不会读到被删除的文件。
+
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "vectors.json"
+CURRENT_FILE = "vectors.current"
+_GENERATION_PREFIX = "vectors-"
+
+
+class NumpyVectorStore:
+    def __init__(self, persist_directory: str, embedding_function: Embeddings):
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self._current_path = os.path.join(persist_directory, CURRENT_FILE)
+        self._generation = 0
+        self._matrix = None
+        self._ids: list[str] = []
+        self._documents: list[str] = []
+        self._metadatas: list[dict] = []
+        # 摄入时的可写副本：chunk_id -> (向量, 原文, 元数据)；为 None 表示只读
+        self._pending: dict | None = None
+        self._load()
+
+    def _generation_dir(self, generation: int) -> str:
+        return os.path.join(self.persist_directory, f"{_GENERATION_PREFIX}{generation}")
+
+    def _read_generation(self) -> int | None:
+        try:
+            with open(self._current_path, "r", encoding="utf-8") as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _load(self):
+        generation = self._read_generation()
+        # 没有指针文件时兼容旧布局（两个文件直接放在 persist_directory 下）
+        directory = self.persist_directory if generation is None else self._generation_dir(generation)
+        vectors_path = os.path.join(directory, VECTORS_FILE)
+        try:
+            with open(os.path.join(directory, METADATA_FILE), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            matrix = np.load(vectors_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return
+        if matrix.shape[0] != len(data["ids"]):
+            raise RuntimeError(f"向量文件与元数据行数不一致：{vectors_path}，请重建索引。")
+        self._generation = generation or 0
+        self._matrix = matrix
+        self._ids = data["ids"]
+        self._documents = data["documents"]
+        self._metadatas = data["metadatas"]
+
+    def __len__(self) -> int:
+        if self._pending is not None:
+            return len(self._pending)
+        return len(self._ids)
+
+    # --- 摄入 ---
+
+    def _writable(self) -> dict:
+        if self._pending is None:
+            self._pending = {
+                chunk_id: (np.array(self._matrix[row]), self._documents[row], self._metadatas[row])
+                for row, chunk_id in enumerate(self._ids)
+            }
+        return self._pending
+
+    def upsert(self, ids: list[str], embeddings: list[list[float]], documents: list[str], metadatas: list[dict]):
+        pending = self._writable()
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors /= norms
+        for chunk_id, vector, text, metadata in zip(ids, vectors, documents, metadatas):
+            pending[chunk_id] = (vector, text, metadata)
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict]):
+        """只更新元数据（内容未变但位置变化的切片），不改动向量"""
+        pending = self._writable()
+        for chunk_id, metadata in zip(ids, metadatas):
+            if chunk_id in pending:
+                vector, text, _ = pending[chunk_id]
+                pending[chunk_id] = (vector, text, metadata)
+
+    def delete(self, ids: list[str]):
+        pending = self._writable()
+        for chunk_id in ids:
+            pending.pop(chunk_id, None)
+
+    def flush(self):
+        """把内存副本写进新的版本目录，再原子替换指针文件切换到新版本"""
+        if self._pending is None:
+            return
+        os.makedirs(self.persist_directory, exist_ok=True)
+        ids = list(self._pending)
+        if ids:
+            matrix = np.stack([self._pending[chunk_id][0] for chunk_id in ids]).astype(np.float32, copy=False)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+
+        # 1. 两个文件写进临时目录，完整写完后整体改名为新版本目录
+        previous = self._read_generation() or 0
+        generation = max(previous, self._generation) + 1
+        target = self._generation_dir(generation)
+        tmp_dir = target + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        shutil.rmtree(target, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, VECTORS_FILE), matrix)
+        with open(os.path.join(tmp_dir, METADATA_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "ids": ids,
+                "documents": [self._pending[chunk_id][1] for chunk_id in ids],
+                "metadatas": [self._pending[chunk_id][2] for chunk_id in ids],
+            }, f, ensure_ascii=False)
+        os.rename(tmp_dir, target)
+
+        # 2. 一次 os.replace 切换指针：此前的读方看到旧版本，此后的读方看到新版本
+        tmp_current = self._current_path + ".tmp"
+        with open(tmp_current, "w", encoding="utf-8") as f:
+            f.write(str(generation))
+        os.replace(tmp_current, self._current_path)
+
+        # 3. 清理更早的版本（保留上一个版本）与旧布局的文件
+        self._remove_stale_generations(keep={generation, previous})
+
+        self._pending = None
+        self._matrix = None
+        self._load()
+
+    def _remove_stale_generations(self, keep: set[int]):
+        for name in os.listdir(self.persist_directory):
+            path = os.path.join(self.persist_directory, name)
+            if name in (VECTORS_FILE, METADATA_FILE):
+                os.remove(path)
+            elif name.startswith(_GENERATION_PREFIX) and os.path.isdir(path):
+                suffix = name[len(_GENERATION_PREFIX):]
+                if not (suffix.isdigit() and int(suffix) in keep):
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def get(self, include: list[str] | None = None) -> dict:
+        """与 Chroma 的 get() 返回结构一致，供 BM25 索引回填使用"""
+        return {"ids": list(self._ids), "documents": list(self._documents), "metadatas": list(self._metadatas)}
+
+    # --- 查询 ---
+
+    def similarity_search(self, query: str, k: int = 4) -> list[Document]:
+        if self._matrix is None or not len(self._ids):
+            return []
+        vector = np.asarray(self.embedding_function.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        scores = self._matrix @ vector
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            Document(page_content=self._documents[row], metadata=self._metadatas[row], id=self._ids[row])
+            for row in top.tolist()
+        ]
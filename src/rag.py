@@ -1,89 +1,595 @@
 import os
+import json
+import time
 import shutil
+import hashlib
+import re
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_community.document_loaders import DirectoryLoader, TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
 from src.config import settings
+from src.embeddings import build_embeddings, embedding_fingerprint
+from src.numpy_store import NumpyVectorStore
+from src.lexical_index import BM25Index, exact_tokens, reciprocal_rank_fusion
+from src.rules import extract_rules, save_rules
+from src.metrics import incr, span
+from src.tokens import estimate_tokens
 
 # 定义向量数据库的持久化路径
 PERSIST_DIRECTORY = "./chroma_db"
+# 摄入清单：记录每个文件/切片的内容哈希，用于增量更新
+MANIFEST_FILE = os.path.join(PERSIST_DIRECTORY, "manifest.json")
+DOCS_DIRECTORY = "docs"
+# BM25 倒排索引（切片原文 + 元数据），与向量库一起维护
+LEXICAL_INDEX_FILE = os.path.join(PERSIST_DIRECTORY, "lexical_index.json")
+# 切分规则版本：切片元数据（start_index / header）变化时递增，旧索引会在下次摄入时重建
+CHUNKING_VERSION = 2
+# 每次重建索引后写入的版本戳，查询侧据此判断缓存是否失效（可跨进程）
+INDEX_VERSION_FILE = os.path.join(PERSIST_DIRECTORY, ".index_version")
 
-def ingest_docs():
-    """读取 docs/ 目录下的文档并存入向量数据库"""
+
+class QueryCache:
+    """
+    有界 LRU + TTL 缓存，记录命中/未命中次数。
+    用于缓存查询向量和 top-k 检索结果。
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """包装 Embedding 模型：文档向量直通，查询向量走缓存"""
+
+    def __init__(self, embeddings: Embeddings, cache: QueryCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(text, vector)
+        return vector
+
+
+# 进程级共享的检索句柄与缓存（惰性初始化）
+_embedding_cache = QueryCache(settings.RAG_CACHE_SIZE, settings.RAG_CACHE_TTL)
+_result_cache = QueryCache(settings.RAG_CACHE_SIZE, settings.RAG_CACHE_TTL)
+_vectorstore = None
+_vectorstore_version = None
+_vectorstore_lock = threading.Lock()
+_lexical_index = None
+_lexical_index_version = None
+
+
+def _build_embeddings():
+    return build_embeddings()
+
+
+def _manifest_fingerprint(manifest: dict) -> str:
+    # 引入可插拔后端之前的清单没有指纹，当时只有 OpenAI Embedding + Chroma
+    embedding = manifest.get("embedding") or f"openai:{settings.EMBEDDING_MODEL_NAME}"
+    return f"{manifest.get('vector_store', 'chroma')}/{embedding}"
+
+
+def _index_fingerprint() -> str:
+    return f"{settings.VECTOR_STORE}/{embedding_fingerprint()}"
+
+
+def _open_store(embeddings: Embeddings):
+    """按 VECTOR_STORE 打开向量库（chroma / numpy）"""
+    if settings.VECTOR_STORE == "numpy":
+        return NumpyVectorStore(PERSIST_DIRECTORY, embeddings)
+    if settings.VECTOR_STORE == "chroma":
+        from langchain_chroma import Chroma
+        return Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings)
+    raise ValueError(f"未知的 VECTOR_STORE: {settings.VECTOR_STORE}（可选 chroma / numpy）")
+
+
+def _upsert(vectorstore, ids, vectors, documents, metadatas):
+    if isinstance(vectorstore, NumpyVectorStore):
+        vectorstore.upsert(ids, vectors, documents, metadatas)
+    else:
+        # 向量已预先算好，直接写入底层集合，避免 Chroma 再调用一次 Embedding
+        vectorstore._collection.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+
+
+def _update_metadata(vectorstore, ids, metadatas):
+    if isinstance(vectorstore, NumpyVectorStore):
+        vectorstore.update_metadata(ids, metadatas)
+    else:
+        vectorstore._collection.update(ids=ids, metadatas=metadatas)
+
+
+def _read_index_version():
+    try:
+        with open(INDEX_VERSION_FILE, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _write_index_version():
+    os.makedirs(PERSIST_DIRECTORY, exist_ok=True)
+    with open(INDEX_VERSION_FILE, "w", encoding="utf-8") as f:
+        f.write(str(time.time_ns()))
+
+
+def invalidate_cache():
+    """丢弃已打开的向量库句柄以及所有查询缓存"""
+    global _vectorstore, _vectorstore_version, _lexical_index, _lexical_index_version
+    with _vectorstore_lock:
+        _vectorstore = None
+        _vectorstore_version = None
+        _lexical_index = None
+        _lexical_index_version = None
+    _embedding_cache.clear()
+    _result_cache.clear()
+
+
+def get_vectorstore():
+    """
+    获取进程级共享的向量库句柄。
+    首次调用时打开向量库（Chroma 或 NumPy）；索引版本戳变化（ingest_docs 重建过索引）时自动重新打开并清空缓存。
+    """
+    global _vectorstore, _vectorstore_version
+    version = _read_index_version()
+    if _vectorstore is not None and version == _vectorstore_version:
+        return _vectorstore
+
+    with _vectorstore_lock:
+        if _vectorstore is None or version != _vectorstore_version:
+            manifest = _load_manifest()
+            if manifest is not None and _manifest_fingerprint(manifest) != _index_fingerprint():
+                raise RuntimeError(
+                    f"知识库由 {_manifest_fingerprint(manifest)} 构建，当前配置为 {_index_fingerprint()}，"
+                    f"请先运行 `uv run -m src.rag` 重建索引。"
+                )
+            _embedding_cache.clear()
+            _result_cache.clear()
+            _vectorstore = _open_store(CachedQueryEmbeddings(_build_embeddings(), _embedding_cache))
+            _vectorstore_version = version
+        return _vectorstore
+
+
+def get_lexical_index() -> BM25Index:
+    """获取进程级共享的 BM25 索引，索引版本戳变化时重新加载"""
+    global _lexical_index, _lexical_index_version
+    version = _read_index_version()
+    if _lexical_index is not None and version == _lexical_index_version:
+        return _lexical_index
+
+    with _vectorstore_lock:
+        if _lexical_index is None or version != _lexical_index_version:
+            _result_cache.clear()
+            _lexical_index = BM25Index.load(LEXICAL_INDEX_FILE)
+            _lexical_index_version = version
+        return _lexical_index
+
+
+def get_cache_stats() -> dict:
+    """返回查询向量缓存和检索结果缓存的命中统计"""
+    return {
+        "embeddings": _embedding_cache.stats(),
+        "results": _result_cache.stats(),
+    }
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.split()).lower()
+
+
+def _hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _load_manifest():
+    """读取摄入清单：{"embedding": 后端指纹, "files": {source: {"hash": 文件哈希, "chunks": [chunk_id, ...]}}}"""
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_manifest(manifest: dict):
+    # 先写临时文件再原子替换，避免中途退出留下半个清单
+    os.makedirs(PERSIST_DIRECTORY, exist_ok=True)
+    tmp_path = MANIFEST_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+
+def _chunk_ids(source: str, splits) -> list[str]:
+    """
+    为每个切片生成稳定 ID：文件路径哈希 + 切片内容哈希。
+    内容不变则 ID 不变；同一文件中内容完全相同的切片追加序号区分。
+    """
+    source_hash = _hash_text(source)[:12]
+    seen = {}
+    ids = []
+    for split in splits:
+        chunk_hash = _hash_text(split.page_content)[:16]
+        split.metadata["chunk_hash"] = chunk_hash
+        n = seen.get(chunk_hash, 0)
+        seen[chunk_hash] = n + 1
+        ids.append(f"{source_hash}-{chunk_hash}" + (f"-{n}" if n else ""))
+    return ids
+
+
+_HEADER_PATTERN = re.compile(r"^#{1,6}\s+(.+?)\s*$", re.MULTILINE)
+
+
+def _annotate_headers(text: str, splits):
+    """为每个切片记录它所在的 Markdown 小节标题（切片起点之前最近的一个标题）"""
+    headers = [(m.start(), m.group(1)) for m in _HEADER_PATTERN.finditer(text)]
+    for split in splits:
+        start = split.metadata.get("start_index", 0)
+        header = ""
+        for position, title in headers:
+            if position > start:
+                break
+            header = title
+        split.metadata["header"] = header
+
+
+def _iter_changed_chunks(loader, text_splitter, old_files: dict, new_files: dict, relocated: list):
+    """
+    流水线第 1~2 步：惰性加载文件 -> 切分。
+    只产出新增/变化的 (chunk_id, Document)，同时把每个文件的最新清单写入 new_files。
+    变化文件中内容未变的切片不重新 Embedding，但其 start_index / 标题可能已经移动，
+    这些 (chunk_id, Document) 追加到 relocated，由调用方只更新元数据。
+    """
+    for doc in loader.lazy_load():
+        source = doc.metadata["source"]
+        file_hash = _hash_text(doc.page_content)
+        old_entry = old_files.get(source)
+        if old_entry and old_entry["hash"] == file_hash:
+            new_files[source] = old_entry
+            continue
+
+        splits = text_splitter.split_documents([doc])
+        _annotate_headers(doc.page_content, splits)
+        ids = _chunk_ids(source, splits)
+        old_ids = set(old_entry["chunks"]) if old_entry else set()
+        new_files[source] = {"hash": file_hash, "chunks": ids}
+        for split, chunk_id in zip(splits, ids):
+            if chunk_id not in old_ids:
+                yield chunk_id, split
+            else:
+                relocated.append((chunk_id, split))
+
+
+def _iter_batches(chunks, max_size: int, max_tokens: int):
+    """流水线第 3 步：按条数和 token 数上限把切片分组成 Embedding 批次"""
+    batch, batch_tokens = [], 0
+    for chunk_id, doc in chunks:
+        tokens = estimate_tokens(doc.page_content)
+        if batch and (len(batch) >= max_size or batch_tokens + tokens > max_tokens):
+            yield batch, batch_tokens
+            batch, batch_tokens = [], 0
+        batch.append((chunk_id, doc))
+        batch_tokens += tokens
+    if batch:
+        yield batch, batch_tokens
+
+
+def _embed_batches(embeddings, batches, concurrency: int):
+    """
+    流水线第 4 步：线程池并发 Embedding，最多同时在途 concurrency 个批次。
+    远程 Embedding 的限速与 429 重试由 src.llm_gateway 统一处理。
+    按完成顺序产出 (batch, tokens, vectors)，调用方可以边收边写库，内存占用与语料规模无关。
+    """
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed") as executor:
+        pending = {}
+        for batch, tokens in batches:
+            texts = [doc.page_content for _, doc in batch]
+            pending[executor.submit(embeddings.embed_documents, texts)] = (batch, tokens)
+            if len(pending) >= concurrency:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch_done, tokens_done = pending.pop(future)
+                    yield batch_done, tokens_done, future.result()
+        for future in as_completed(list(pending)):
+            batch_done, tokens_done = pending.pop(future)
+            yield batch_done, tokens_done, future.result()
+
+
+def ingest_docs(rebuild: bool = False):
+    """
+    读取 docs/ 目录下的文档并增量更新向量数据库。
+    通过 chroma_db/manifest.json 记录每个文件及其切片的内容哈希：
+    只对新增/变化的切片做 Embedding，删除已移除文件的切片，按稳定 ID upsert。
+    摄入是流式的：惰性加载 -> 切分 -> 分批 -> 并发 Embedding -> 每批完成即写入向量库。
+    :param rebuild: 为 True 时清空数据库后全量重建
+    """
     
     # 1. 检查文档目录是否存在
-    if not os.path.exists("docs"):
-        print("❌ 目录 'docs' 不存在，请先创建并放入文档。")
+    if not os.path.exists(DOCS_DIRECTORY):
+        print(f"❌ 目录 '{DOCS_DIRECTORY}' 不存在，请先创建并放入文档。")
         return
 
-    # 2. 加载文档
-    print("📂 Loading documents...")
-    loader = DirectoryLoader("docs", glob="**/*.md", loader_cls=TextLoader, loader_kwargs={"encoding": "utf-8"})
-    docs = loader.load()
-    print(f"   Found {len(docs)} documents.")
+    manifest = _load_manifest()
+    # 没有清单的旧数据库无法判断切片归属，只能全量重建
+    if manifest is None and os.path.exists(PERSIST_DIRECTORY):
+        rebuild = True
+    # 切换了向量库或 Embedding 后端/模型：新旧向量不可混用，必须全量重建
+    fingerprint = _index_fingerprint()
+    if manifest is not None and _manifest_fingerprint(manifest) != fingerprint:
+        print(f"   Index settings changed ({_manifest_fingerprint(manifest)} -> {fingerprint}), rebuilding index.")
+        rebuild = True
+    # 切分规则变化：切片 ID 可能不变但元数据不同，同样全量重建
+    if manifest is not None and manifest.get("chunking", 1) != CHUNKING_VERSION:
+        print("   Chunking rules changed, rebuilding index.")
+        rebuild = True
+    if rebuild:
+        # 先释放本进程持有的旧句柄和缓存
+        invalidate_cache()
+        if os.path.exists(PERSIST_DIRECTORY):
+            shutil.rmtree(PERSIST_DIRECTORY)
+            print("   Cleared existing database.")
+        manifest = None
+    old_files = manifest["files"] if manifest else {}
 
-    if not docs:
-        return
-
-    # 3. 切分文档
-    print("✂️ Splitting documents...")
+    # 2. 准备加载器、切分器和 Embedding 模型
+    loader = DirectoryLoader(DOCS_DIRECTORY, glob="**/*.md", loader_cls=TextLoader, loader_kwargs={"encoding": "utf-8"})
+    # add_start_index：记录切片在原文中的偏移，检索结果打包时据此合并重叠的相邻切片
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
-        chunk_overlap=200
-    )
-    splits = text_splitter.split_documents(docs)
-    print(f"   Split into {len(splits)} chunks.")
-
-    # 4. 初始化 Embedding 模型
-    embeddings = OpenAIEmbeddings(
-        base_url=settings.AI_BASE_URL,
-        api_key=settings.API_KEY,
-        model=settings.EMBEDDING_MODEL_NAME
+        chunk_overlap=200,
+        add_start_index=True
     )
+    embeddings = _build_embeddings()
+    vectorstore = _open_store(embeddings)
+    lexical = BM25Index.load(LEXICAL_INDEX_FILE)
+    backfilled = not len(lexical) and bool(old_files)
+    if backfilled:
+        # 旧版本摄入的库没有 BM25 索引：从向量库中回填原文，无需重新 Embedding
+        existing = vectorstore.get(include=["documents", "metadatas"])
+        for chunk_id, text, metadata in zip(existing["ids"], existing["documents"], existing["metadatas"]):
+            lexical.add(chunk_id, text, metadata or {})
 
-    # 5. 存入 ChromaDB
-    # 如果数据库已存在，先清空以便重新索引（可选，开发阶段方便）
-    if os.path.exists(PERSIST_DIRECTORY):
-        shutil.rmtree(PERSIST_DIRECTORY)
-        print("   Cleared existing database.")
-
-    print("💾 Saving to vector database...")
-    vectorstore = Chroma.from_documents(
-        documents=splits,
-        embedding=embeddings,
-        persist_directory=PERSIST_DIRECTORY
-    )
-    print("✅ Ingestion complete!")
+    # 3. 流式摄入：每个批次 Embedding 完成后立即写入向量库
+    print("📂 Streaming documents into vector database...")
+    new_files, relocated = {}, []
+    chunks = _iter_changed_chunks(loader, text_splitter, old_files, new_files, relocated)
+    batches = _iter_batches(chunks, settings.EMBED_BATCH_SIZE, settings.EMBED_BATCH_MAX_TOKENS)
+    start = time.perf_counter()
+    total_chunks, total_tokens = 0, 0
+    for batch, tokens, vectors in _embed_batches(embeddings, batches, settings.EMBED_CONCURRENCY):
+        _upsert(
+            vectorstore,
+            [chunk_id for chunk_id, _ in batch],
+            vectors,
+            [doc.page_content for _, doc in batch],
+            [doc.metadata for _, doc in batch]
+        )
+        for chunk_id, doc in batch:
+            lexical.add(chunk_id, doc.page_content, doc.metadata)
+        total_chunks += len(batch)
+        total_tokens += tokens
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        print(f"   💾 {total_chunks} chunks written | "
+              f"{total_chunks / elapsed:.1f} chunks/s, {total_tokens / elapsed:.0f} tokens/s")
+    print(f"   Found {len(new_files)} documents.")
+
+    # 4. 变化文件中内容未变的切片：刷新元数据（偏移、标题），否则打包时会按过期偏移拼接
+    if relocated:
+        _update_metadata(vectorstore, [chunk_id for chunk_id, _ in relocated], [doc.metadata for _, doc in relocated])
+        for chunk_id, doc in relocated:
+            lexical.add(chunk_id, doc.page_content, doc.metadata)
+
+    # 5. 删除已移除文件/已变化文件中过期的切片
+    live_ids = {cid for entry in new_files.values() for cid in entry["chunks"]}
+    stale_ids = [cid for entry in old_files.values() for cid in entry["chunks"] if cid not in live_ids]
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+        for chunk_id in stale_ids:
+            lexical.remove(chunk_id)
+    print(f"   {total_chunks} new/changed chunks, {len(relocated)} relocated, {len(stale_ids)} stale chunks removed.")
+
+    # 6. 提取文档中追加的机器可读规范（devmate-rules 代码块），与内置规则一起供写入工具本地检查
+    rules = extract_rules(DOCS_DIRECTORY)
+    save_rules(rules)
+    print(f"   📏 {len(rules['rules'])} machine-checkable rules extracted from docs.")
+
+    if not total_chunks and not relocated and not stale_ids and not rebuild and not backfilled:
+        print("✅ Index is up to date.")
+        return
+
+    if isinstance(vectorstore, NumpyVectorStore):
+        vectorstore.flush()
+    lexical.save(LEXICAL_INDEX_FILE)
+    _save_manifest({
+        "vector_store": settings.VECTOR_STORE,
+        "embedding": embedding_fingerprint(),
+        "chunking": CHUNKING_VERSION,
+        "files": new_files
+    })
+    # 更新版本戳，通知各进程中的查询缓存失效
+    _write_index_version()
+    invalidate_cache()
+    elapsed = time.perf_counter() - start
+    print(f"✅ Ingestion complete! ({elapsed:.1f}s)")
 
-def query_knowledge_base(query: str, k: int = 2):
+
+def _docs_signature():
+    """docs/ 下所有 Markdown 文件的 (路径, 修改时间, 大小) 快照"""
+    signature = {}
+    for root, _, files in os.walk(DOCS_DIRECTORY):
+        for name in files:
+            if name.endswith(".md"):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                signature[path] = (stat.st_mtime_ns, stat.st_size)
+    return signature
+
+
+def watch_docs(interval: float = 2.0):
+    """
+    轮询 docs/ 目录，文件变化时自动执行增量摄入。
+    适用于 docker-compose 挂载的 docs 卷在宿主机上被编辑的场景（轮询对挂载卷最可靠）。
     """
-    查询向量数据库
+    print(f"👀 Watching '{DOCS_DIRECTORY}' for changes (Ctrl+C to stop)...")
+    ingest_docs()
+    last = _docs_signature()
+    try:
+        while True:
+            time.sleep(interval)
+            current = _docs_signature()
+            if current != last:
+                print("\n🔄 Change detected, re-indexing...")
+                try:
+                    ingest_docs()
+                except Exception as e:
+                    print(f"❌ Ingestion failed: {str(e)}")
+                last = current
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+
+def _chunk_key(doc: Document) -> str:
+    # 向量库与 BM25 返回的同一切片按内容哈希对齐
+    return doc.metadata.get("chunk_hash") or _hash_text(doc.page_content)[:16]
+
+
+def _lexical_docs(lexical: BM25Index, hits) -> list[Document]:
+    return [
+        Document(page_content=lexical.docs[cid]["text"], metadata=lexical.docs[cid]["metadata"], id=cid)
+        for cid, _ in hits
+    ]
+
+
+def _retrieve(query: str, k: int, mode: str, s) -> list[Document]:
+    lexical = get_lexical_index()
+
+    # 1. 精确标识符查找（如 dm_secret_）：BM25 能命中时直接返回，不调用 Embedding
+    exact = exact_tokens(query)
+    if mode == "lexical" or (mode == "hybrid" and exact and all(lexical.contains(t) for t in exact)):
+        hits = lexical.search(query, k, required=exact or None)
+        if hits or mode == "lexical":
+            s.set(path="lexical")
+            return _lexical_docs(lexical, hits)
+
+    # 2. 向量检索
+    vectorstore = get_vectorstore()
+    if mode == "vector" or not len(lexical):
+        s.set(path="vector")
+        return vectorstore.similarity_search(query, k=k)
+
+    # 3. 混合检索：两路各取若干候选，用 RRF 融合
+    candidates = max(k, settings.RAG_HYBRID_CANDIDATES)
+    lexical_hits = lexical.search(query, candidates)
+    # 向量一路的最大得分（排第 1）小于 BM25 相邻名次的最小分差时，融合结果必然等于 BM25 前 k 名，
+    # 此时跳过 Embedding 与向量检索（默认的等权 RRF 不满足该条件，只有调低向量权重时才会生效）
+    rrf_k, vector_weight = settings.RAG_HYBRID_RRF_K, settings.RAG_HYBRID_VECTOR_WEIGHT
+    if len(lexical_hits) >= k and 1.0 / (rrf_k + k) - 1.0 / (rrf_k + k + 1) > vector_weight / (rrf_k + 1):
+        s.set(path="lexical")
+        return _lexical_docs(lexical, lexical_hits[:k])
+    vector_docs = vectorstore.similarity_search(query, k=candidates)
+    lexical_docs = _lexical_docs(lexical, lexical_hits)
+    by_key = {}
+    for doc in vector_docs + lexical_docs:
+        by_key.setdefault(_chunk_key(doc), doc)
+    fused = reciprocal_rank_fusion([
+        [_chunk_key(doc) for doc in vector_docs],
+        [_chunk_key(doc) for doc in lexical_docs],
+    ], k=rrf_k, weights=[vector_weight, 1.0])
+    s.set(path="hybrid")
+    return [by_key[key] for key in fused[:k]]
+
+
+def query_knowledge_base(query: str, k: int = 2, mode: str | None = None):
+    """
+    查询知识库（默认 BM25 + 向量混合检索）
     :param query: 用户问题
     :param k: 返回最相关的文档块数量
+    :param mode: "hybrid" / "vector" / "lexical"，默认取 settings.RAG_RETRIEVAL_MODE
     :return: 相关的文档列表
     """
-    embeddings = OpenAIEmbeddings(
-        base_url=settings.AI_BASE_URL,
-        api_key=settings.API_KEY,
-        model=settings.EMBEDDING_MODEL_NAME
-    )
-    
-    # 加载已存在的数据库
-    vectorstore = Chroma(
-        persist_directory=PERSIST_DIRECTORY,
-        embedding_function=embeddings
-    )
-    
-    print(f"\n🔍 Searching for: '{query}'")
-    results = vectorstore.similarity_search(query, k=k)
-    
+    mode = mode or settings.RAG_RETRIEVAL_MODE
+    with span("rag.query", k=k, mode=mode) as s:
+        # 键中带上索引版本戳：其他进程重建索引后，本进程的旧结果不会再命中
+        key = (_read_index_version(), _normalize_query(query), k, mode)
+        cached = _result_cache.get(key)
+        incr("devmate_cache_lookups_total", cache="rag", result="hit" if cached is not None else "miss")
+        if cached is not None:
+            s.set(cache_hit=True, chunks=len(cached))
+            return list(cached)
+
+        print(f"\n🔍 Searching for: '{query}'")
+        results = _retrieve(query, k, mode, s)
+        _result_cache.put(key, tuple(results))
+        s.set(cache_hit=False, chunks=len(results))
+        incr("devmate_rag_chunks_total", len(results))
+
     return results
 
 # --- 测试代码 ---
 if __name__ == "__main__":
-    # 1. 先执行摄入（如果已经摄入过，这步可以注释掉）
-    ingest_docs()
+    parser = argparse.ArgumentParser(description="DevMate 知识库摄入")
+    parser.add_argument("--rebuild", action="store_true", help="清空数据库后全量重建")
+    parser.add_argument("--watch", action="store_true", help="监听 docs/ 变化并自动增量摄入")
+    parser.add_argument("--interval", type=float, default=2.0, help="--watch 的轮询间隔（秒）")
+    args = parser.parse_args()
+
+    if args.watch:
+        watch_docs(args.interval)
+        raise SystemExit(0)
+
+    # 1. 先执行摄入（增量更新，未变化的文档不会重新 Embedding）
+    ingest_docs(rebuild=args.rebuild)
     
     # 2. 测试查询
     test_query = "变量命名有什么要求？"
@@ -93,4 +599,8 @@ if __name__ == "__main__":
     for i, doc in enumerate(hits):
         print(f"--- Result {i+1} ---")
         print(doc.page_content)
-        print("------------------")
\ No newline at end of file
+        print("------------------")
+
+    # 3. 再查一次，验证缓存命中
+    query_knowledge_base(test_query)
+    print(f"\n📊 Cache stats: {get_cache_stats()}")
\ No newline at end of file
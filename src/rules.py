@@ -0,0 +1,277 @@
+import os
+import re
+import ast
+import json
+import threading
+from src.config import settings
+from src.metrics import incr
+
+# 本地规范检查引擎：在 write_file / write_files 落盘前用 AST 检查生成的 Python 代码
+# 《内部开发规范 V1.0》中可静态检查的两条规范（第 1、2 条）内置为 BUILTIN_RULES；
+# 全局变量前缀的豁免名单（app、router 等框架约定对象）由配置 RULES_GLOBAL_ALLOW 提供，不写进规范文档。
+# 其他文档也可以用机器可读的代码块追加规则（同 id 覆盖内置规则）：
+#
+#   ```devmate-rules
+#   {"rules": [{"id": "...", "type": "module_assignment_prefix", ...}]}
+#   ```
+#
+# ingest_docs 摄入时把所有代码块合并提取到向量库目录下的 rules.json，写入工具按文件修改时间懒加载。
+# 支持的规则类型：
+#   - module_assignment_prefix：模块级赋值（含函数内 global 声明）的变量名必须带前缀
+#   - response_field：路由处理函数返回的字典字面量 / JSONResponse，以及 *Response 结尾的
+#     pydantic 模型，必须包含指定字段（且取值正确）
+# 违规会立即作为工具结果返回给模型，在同一步内修正，而不是等用户审查后再花一整轮对话返工。
+
+BUILTIN_RULES = [
+    # 第 1 条：所有全局变量必须以 dm_secret_ 开头
+    {"id": "global-prefix", "type": "module_assignment_prefix", "prefix": "dm_secret_"},
+    # 第 2 条：所有 API JSON 响应体必须包含 "happiness_level": "max"
+    {"id": "happiness-level", "type": "response_field", "field": "happiness_level", "value": "max", "model_suffix": "Response"},
+]
+
+_BLOCK_PATTERN = re.compile(r"```devmate-rules\s*\n(.*?)\n```", re.DOTALL)
+_HTTP_METHODS = {"get", "post", "put", "patch", "delete", "api_route"}
+
+
+def extract_rules(docs_directory: str) -> dict:
+    """从 docs/ 下所有 Markdown 的 devmate-rules 代码块中提取规则，按 id 去重（后出现的覆盖先出现的）"""
+    rules = {}
+    for root, _, files in os.walk(docs_directory):
+        for name in sorted(files):
+            if not name.endswith(".md"):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            for block in _BLOCK_PATTERN.findall(text):
+                try:
+                    data = json.loads(block)
+                except ValueError as e:
+                    print(f"⚠️ Invalid devmate-rules block in {path}: {str(e)}")
+                    continue
+                for rule in data.get("rules", []):
+                    rules[rule["id"]] = {**rule, "source": path}
+    return {"rules": list(rules.values())}
+
+
+def _rules_file() -> str:
+    # 与向量库同目录（延迟导入：src.rag 本身导入了本模块）
+    from src.rag import PERSIST_DIRECTORY
+    return os.path.join(PERSIST_DIRECTORY, "rules.json")
+
+
+def save_rules(rules: dict, path: str | None = None):
+    path = path or _rules_file()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(rules, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+# 按文件修改时间缓存已加载的规则
+_cache = {"mtime": None, "rules": []}
+_cache_lock = threading.Lock()
+
+
+def load_rules(path: str | None = None) -> list[dict]:
+    """内置规则 + 文档中提取的规则（同 id 以文档为准）"""
+    try:
+        mtime = os.stat(path or _rules_file()).st_mtime_ns
+    except OSError:
+        return BUILTIN_RULES
+    with _cache_lock:
+        if _cache["mtime"] != mtime:
+            try:
+                with open(path or _rules_file(), "r", encoding="utf-8") as f:
+                    extracted = json.load(f).get("rules", [])
+            except (OSError, ValueError):
+                extracted = []
+            merged = {rule["id"]: rule for rule in BUILTIN_RULES}
+            merged.update((rule["id"], rule) for rule in extracted)
+            _cache["rules"] = list(merged.values())
+            _cache["mtime"] = mtime
+        return _cache["rules"]
+
+
+# --- 规则实现 ---
+
+def _assigned_names(target):
+    if isinstance(target, ast.Name):
+        yield target
+    elif isinstance(target, (ast.Tuple, ast.List)):
+        for element in target.elts:
+            yield from _assigned_names(element)
+    elif isinstance(target, ast.Starred):
+        yield from _assigned_names(target.value)
+
+
+def _module_level_statements(body):
+    """模块顶层语句，包括 if / try / with 块内的（它们同样定义全局变量），不进入函数和类"""
+    for node in body:
+        yield node
+        if isinstance(node, (ast.If, ast.For, ast.While, ast.With)):
+            yield from _module_level_statements(node.body)
+            yield from _module_level_statements(getattr(node, "orelse", []))
+        elif isinstance(node, ast.Try):
+            yield from _module_level_statements(node.body)
+            for handler in node.handlers:
+                yield from _module_level_statements(handler.body)
+            yield from _module_level_statements(node.orelse)
+            yield from _module_level_statements(node.finalbody)
+
+
+def _check_assignment_prefix(tree, rule: dict) -> list[tuple[int, str]]:
+    prefix = rule["prefix"]
+    allow = set(rule.get("allow", [])) | set(settings.RULES_GLOBAL_ALLOW)
+    found = []
+
+    def check(name: str, line: int):
+        if name.startswith(prefix) or name in allow or (name.startswith("__") and name.endswith("__")):
+            return
+        found.append((line, f"全局变量 `{name}` 必须以 `{prefix}` 开头（例如 `{prefix}{name.lstrip('_').lower()}`）"))
+
+    for node in _module_level_statements(tree.body):
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                for name in _assigned_names(target):
+                    check(name.id, node.lineno)
+        elif isinstance(node, (ast.AnnAssign, ast.AugAssign)):
+            for name in _assigned_names(node.target):
+                check(name.id, node.lineno)
+        elif isinstance(node, (ast.For, ast.With)):
+            targets = [node.target] if isinstance(node, ast.For) else [i.optional_vars for i in node.items if i.optional_vars]
+            for target in targets:
+                for name in _assigned_names(target):
+                    check(name.id, node.lineno)
+
+    # 函数内通过 global 声明写入的变量同样是全局变量
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Global):
+            for name in node.names:
+                check(name, node.lineno)
+
+    # 同一变量只报告第一次出现
+    seen, unique = set(), []
+    for line, message in sorted(found):
+        if message not in seen:
+            seen.add(message)
+            unique.append((line, message))
+    return unique
+
+
+def _is_route_handler(node) -> bool:
+    for decorator in node.decorator_list:
+        if isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute) \
+                and decorator.func.attr in _HTTP_METHODS:
+            return True
+    return False
+
+
+def _returned_dicts(function):
+    """路由函数中 return 的字典字面量，以及 return JSONResponse({...}) / JSONResponse(content={...})"""
+    for node in ast.walk(function):
+        if not isinstance(node, ast.Return) or node.value is None:
+            continue
+        value = node.value
+        if isinstance(value, ast.Call) and getattr(value.func, "id", getattr(value.func, "attr", "")).endswith("JSONResponse"):
+            content = value.args[0] if value.args else next((k.value for k in value.keywords if k.arg == "content"), None)
+            value = content
+        if isinstance(value, ast.Dict):
+            yield node.lineno, value
+
+
+def _dict_field(node: ast.Dict, field: str):
+    """返回 (是否包含字段, 字段值节点)；字典中有 **展开时无法静态判断，视为包含"""
+    for key, value in zip(node.keys, node.values):
+        if key is None:
+            return True, None
+        if isinstance(key, ast.Constant) and key.value == field:
+            return True, value
+    return False, None
+
+
+def _is_pydantic_model(node: ast.ClassDef) -> bool:
+    for base in node.bases:
+        name = base.id if isinstance(base, ast.Name) else getattr(base, "attr", "")
+        if name == "BaseModel":
+            return True
+    return False
+
+
+def _check_response_field(tree, rule: dict) -> list[tuple[int, str]]:
+    field, expected = rule["field"], rule.get("value")
+    suffix = rule.get("model_suffix", "Response")
+    found = []
+
+    def check_value(line: int, value, where: str):
+        if expected is not None and isinstance(value, ast.Constant) and value.value != expected:
+            found.append((line, f"{where}中 `{field}` 的值必须是 {json.dumps(expected)}，当前为 {json.dumps(value.value, ensure_ascii=False)}"))
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and _is_route_handler(node):
+            for line, value in _returned_dicts(node):
+                present, field_value = _dict_field(value, field)
+                where = f"路由 `{node.name}` 返回的 JSON "
+                if not present:
+                    found.append((line, f"{where}缺少必需字段 `\"{field}\": {json.dumps(expected)}`"))
+                else:
+                    check_value(line, field_value, where)
+
+        elif isinstance(node, ast.ClassDef) and node.name.endswith(suffix) and _is_pydantic_model(node):
+            fields = {
+                item.target.id: item for item in node.body
+                if isinstance(item, ast.AnnAssign) and isinstance(item.target, ast.Name)
+            }
+            where = f"响应模型 `{node.name}` "
+            if field not in fields:
+                found.append((node.lineno, f"{where}缺少字段 `{field}: str = {json.dumps(expected)}`"))
+            else:
+                check_value(fields[field].lineno, fields[field].value, where)
+    return found
+
+
+_CHECKS = {
+    "module_assignment_prefix": _check_assignment_prefix,
+    "response_field": _check_response_field,
+}
+
+
+def check_python(source: str, rules: list[dict]) -> list[dict]:
+    """
+    对一段 Python 源码执行所有规则。
+    :return: [{"rule": 规则 id, "line": 行号, "message": 说明}]，无法解析的代码不做检查
+    """
+    if not rules:
+        return []
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return []
+    violations = []
+    for rule in rules:
+        check = _CHECKS.get(rule.get("type"))
+        if check is None:
+            continue
+        for line, message in check(tree, rule):
+            violations.append({"rule": rule["id"], "line": line, "message": message})
+    violations.sort(key=lambda v: v["line"])
+    return violations
+
+
+def check_file(file_path: str, content: str) -> list[dict]:
+    """写入前检查单个文件（目前只检查 .py），并记录违规计数"""
+    if not file_path.endswith(".py"):
+        return []
+    violations = check_python(content, load_rules())
+    for violation in violations:
+        incr("devmate_rule_violations_total", rule=violation["rule"])
+    if violations:
+        print(f"   🛡️ Rules: {file_path} has {len(violations)} violation(s), write rejected")
+    return violations
+
+
+def format_violations(file_path: str, violations: list[dict]) -> str:
+    lines = [f"{file_path} violates internal rules (file NOT written, fix and write again):"]
+    lines.extend(f"  line {v['line']} [{v['rule']}]: {v['message']}" for v in violations)
+    return "\n".join(lines)
@@ -1,46 +1,169 @@
+import sys
+import json
 import asyncio
 from mcp.server.fastmcp import FastMCP
-from tavily import TavilyClient
 from src.config import settings
+from src.context_packing import pack_search_results, report_savings
+from src.disk_cache import DiskCache
+from src.metrics import span
 
 # 1. 初始化 MCP Server
 # "devmate-search" 是服务名称
 mcp = FastMCP("devmate-search")
 
-# 2. 初始化 Tavily 客户端
-tavily_client = TavilyClient(api_key=settings.TAVILY_API_KEY)
+# 2. Tavily 客户端在第一次真正搜索时才创建（命中缓存的查询和 Server 握手都不需要导入 tavily）
+tavily_client = None
 
-# 3. 定义工具 (Tool)
+
+def _get_tavily():
+    global tavily_client
+    if tavily_client is None:
+        from tavily import TavilyClient
+        tavily_client = TavilyClient(api_key=settings.TAVILY_API_KEY)
+    return tavily_client
+
+# 3. 初始化搜索结果磁盘缓存（按 规范化查询 + max_results 缓存，团队内多次相同调研直接命中本地）
+search_cache = None
+if settings.SEARCH_CACHE_ENABLED:
+    search_cache = DiskCache(
+        settings.SEARCH_CACHE_PATH,
+        ttl=settings.SEARCH_CACHE_TTL,
+        max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+        max_bytes=settings.SEARCH_CACHE_MAX_BYTES
+    )
+
+
+def _cache_key(query: str, max_results: int) -> str:
+    normalized = " ".join(query.lower().split())
+    return f"{max_results}:{normalized}"
+
+
+async def _search(query: str, max_results: int) -> list[dict]:
+    """执行一次搜索，返回结构化结果列表（优先读缓存）"""
+    with span("mcp.search", max_results=max_results) as s:
+        key = _cache_key(query, max_results)
+        if search_cache is not None:
+            cached = search_cache.get(key)
+            if cached is not None:
+                s.set(cache_hit=True, results=len(cached))
+                return cached
+
+        # TavilyClient 是同步 HTTP 客户端，放到线程池执行，避免阻塞 Server 的事件循环
+        response = await asyncio.to_thread(_get_tavily().search, query, max_results=max_results)
+        results = [
+            {
+                "title": result.get("title", "No Title"),
+                "url": result.get("url", "#"),
+                "content": result.get("content", ""),
+                "score": result.get("score", 0.0),
+            }
+            for result in response.get("results", [])
+        ]
+
+        if search_cache is not None:
+            search_cache.set(key, results)
+        s.set(cache_hit=False, results=len(results))
+    return results
+
+
+def _format_results(results: list[dict]) -> str:
+    return "\n".join(
+        f"Title: {r['title']}\nURL: {r['url']}\nContent: {r['content']}\n---"
+        for r in results
+    )
+
+
+# 4. 定义工具 (Tool)
 # 使用装饰器 @mcp.tool 注册这个函数，让它变成 MCP 可调用的工具
 @mcp.tool()
 async def search_web(query: str, max_results: int = 3) -> str:
     """
     使用 Tavily 搜索引擎搜索互联网。
     当用户询问当前事件、技术文档或任何不在本地知识库中的信息时使用。
-    
+
     Args:
         query: 搜索关键词
         max_results: 返回结果的数量，默认为 3
     """
-    print(f"[MCP Server] Searching for: {query}")
+    # stdio 模式下 stdout 是协议通道，日志只能写 stderr
+    print(f"[MCP Server] Searching for: {query}", file=sys.stderr)
     try:
-        # 调用 Tavily API
-        response = tavily_client.search(query, max_results=max_results)
-        
-        # 格式化结果
-        results = []
-        for result in response.get("results", []):
-            title = result.get("title", "No Title")
-            url = result.get("url", "#")
-            content = result.get("content", "")
-            results.append(f"Title: {title}\nURL: {url}\nContent: {content}\n---")
-            
-        return "\n".join(results)
-        
+        results = await _search(query, max_results)
+        results, before, after = pack_search_results(results, settings.CONTEXT_PACK_SEARCH_MAX_TOKENS)
+        report_savings("search_web", before, after)
+        return _format_results(results)
+
     except Exception as e:
         return f"Error performing search: {str(e)}"
 
-# 4. 运行服务器
+
+@mcp.tool()
+async def search_web_batch(queries: list[str], max_results: int = 3) -> str:
+    """
+    一次并发执行多个搜索查询，按 URL 去重后合并成一个排序好的结果块。
+    需要同时调研多个问题时使用，比多次调用 search_web 更快。
+
+    Args:
+        queries: 搜索关键词列表
+        max_results: 每个查询返回结果的数量，默认为 3
+    """
+    # 去掉重复查询（保持原顺序），并限制单次批量的查询数
+    unique_queries = list(dict.fromkeys(q.strip() for q in queries if q.strip()))
+    # 超出上限的查询不执行，但在结果中列出，避免模型误以为已经搜索过
+    skipped = unique_queries[settings.SEARCH_BATCH_MAX_QUERIES:]
+    unique_queries = unique_queries[:settings.SEARCH_BATCH_MAX_QUERIES]
+    print(f"[MCP Server] Batch searching {len(unique_queries)} queries", file=sys.stderr)
+
+    semaphore = asyncio.Semaphore(settings.SEARCH_BATCH_CONCURRENCY)
+
+    async def _run(query: str):
+        async with semaphore:
+            return await _search(query, max_results)
+
+    outcomes = await asyncio.gather(*[_run(q) for q in unique_queries], return_exceptions=True)
+
+    # 按 URL 合并：被越多查询命中、相关度越高的结果排在越前面
+    merged = {}
+    errors = []
+    for query, outcome in zip(unique_queries, outcomes):
+        if isinstance(outcome, Exception):
+            errors.append(f"{query}: {str(outcome)}")
+            continue
+        for result in outcome:
+            entry = merged.get(result["url"])
+            if entry is None:
+                merged[result["url"]] = {**result, "queries": [query]}
+            else:
+                entry["queries"].append(query)
+                entry["score"] = max(entry["score"], result["score"])
+    ranked = sorted(merged.values(), key=lambda r: (len(r["queries"]), r["score"]), reverse=True)
+    # 不同 URL 转载的同一段内容只保留排名最高的一条，并按 token 预算截断
+    ranked, before, after = pack_search_results(ranked, settings.CONTEXT_PACK_SEARCH_MAX_TOKENS)
+    report_savings("search_web_batch", before, after)
+
+    blocks = [
+        f"Title: {r['title']}\nURL: {r['url']}\nQueries: {', '.join(r['queries'])}\nContent: {r['content']}\n---"
+        for r in ranked
+    ]
+    if errors:
+        blocks.append("Failed queries:\n" + "\n".join(errors))
+    if skipped:
+        blocks.append(
+            f"Skipped queries (batch limit is {settings.SEARCH_BATCH_MAX_QUERIES}, NOT searched; "
+            f"send them in another call if still needed):\n" + "\n".join(skipped)
+        )
+    return "\n".join(blocks)
+
+
+@mcp.tool()
+def search_cache_stats() -> str:
+    """返回搜索结果缓存的命中统计（条目数、占用字节、命中率等）"""
+    if search_cache is None:
+        return json.dumps({"enabled": False})
+    return json.dumps({"enabled": True, **search_cache.stats()})
+
+
+# 5. 运行服务器
 if __name__ == "__main__":
     # 使用 stdio 模式运行 (标准输入输出通信)
-    mcp.run()
\ No newline at end of file
+    mcp.run()
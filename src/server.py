@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import contextlib
+import uvicorn
+from langchain_core.messages import HumanMessage, SystemMessage
+from sse_starlette.sse import EventSourceResponse
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+from src.config import settings
+from src.agent import astream_turn, create_async_agent
+from src.mcp_client import get_search_client, shutdown_search_client
+from src.llm_gateway import get_gateway
+from src.metrics import render_prometheus
+
+# DevMate HTTP/SSE 服务模式
+# 进程启动时只编译一次 Agent 图，并预热 LLM 客户端、向量检索句柄和 MCP 搜索会话；
+# 多个用户通过 session_id 隔离各自的对话历史，共享同一个热 Agent。
+#
+#   POST   /sessions                     创建会话 -> {"session_id": ...}
+#   POST   /sessions/{id}/messages       发送消息，SSE 流式返回 token / 工具事件 / 最终回复
+#   GET    /sessions/{id}                查看会话概况
+#   DELETE /sessions/{id}                删除会话
+#   GET    /health                       运行状态（并发、排队、会话数）
+#   GET    /metrics                      Prometheus 文本格式的计数器/直方图（需 METRICS_ENABLED=true）
+
+os.environ["LANGCHAIN_TRACING_V2"] = "true" if settings.LANGCHAIN_TRACING_V2 else "false"
+os.environ["LANGCHAIN_API_KEY"] = settings.LANGCHAIN_API_KEY
+os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
+
+
+class Session:
+    def __init__(self, system_prompt: str):
+        self.messages = [SystemMessage(content=system_prompt)]
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+class AdmissionController:
+    """
+    准入控制：最多 max_running 个运行同时执行，最多 max_queued 个请求排队等待，
+    超出时直接拒绝（HTTP 429），避免一个容器被压垮。
+    名额在返回响应之前同步预留（try_reserve），并发请求无法同时通过检查。
+    """
+
+    def __init__(self, max_running: int, max_queued: int):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.running = 0
+        self.queued = 0
+        self._semaphore = asyncio.Semaphore(max_running)
+
+    def try_reserve(self) -> bool:
+        if self.running + self.queued >= self.max_running + self.max_queued:
+            return False
+        self.queued += 1
+        return True
+
+    def cancel(self):
+        """释放一个未开始运行的预留名额"""
+        self.queued -= 1
+
+    async def start(self):
+        """预留名额等待执行槽位；无论是否被取消，排队计数都会扣除"""
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+
+    def finish(self):
+        self.running -= 1
+        self._semaphore.release()
+
+
+class Reservation:
+    """
+    post_message 在返回响应前占住的会话锁与准入名额。
+    由 SSE 生成器在 finally 中释放；生成器没有机会运行时（客户端提前断开），由响应的后台任务兜底。
+    release() 可重复调用。
+    """
+
+    def __init__(self, session: Session, admission: AdmissionController):
+        self.session = session
+        self.admission = admission
+        self.state = "queued"
+
+    async def start(self):
+        self.state = "starting"
+        await self.admission.start()
+        self.state = "running"
+
+    def release(self):
+        if self.state == "released":
+            return
+        if self.state == "queued":
+            self.admission.cancel()
+        elif self.state == "running":
+            self.admission.finish()
+        self.state = "released"
+        self.session.lock.release()
+
+
+class DevMateServer:
+    def __init__(self):
+        self.agent_app = None
+        self.system_prompt = ""
+        self.sessions: dict[str, Session] = {}
+        self.admission = AdmissionController(settings.SERVER_MAX_CONCURRENT_RUNS, settings.SERVER_MAX_QUEUE)
+        self._reaper: asyncio.Task | None = None
+
+    async def startup(self):
+        print("🤖 DevMate server starting...")
+        # 1. 编译一次 Agent 图（LLM 客户端随之创建并复用）
+        self.agent_app, self.system_prompt = create_async_agent()
+
+        # 2. 预热向量检索句柄与 MCP 搜索会话（失败不影响启动，首次使用时会重试）
+        try:
+            from src.rag import get_vectorstore
+            await asyncio.to_thread(get_vectorstore)
+        except Exception as e:
+            print(f"⚠️ Retriever warm-up failed: {str(e)}")
+        try:
+            await get_search_client().acall_tool("search_cache_stats", {})
+        except Exception as e:
+            print(f"⚠️ MCP search warm-up failed: {str(e)}")
+
+        self._reaper = asyncio.create_task(self._reap_sessions())
+        print(f"✅ DevMate server ready on http://{settings.SERVER_HOST}:{settings.SERVER_PORT}")
+
+    async def shutdown(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        await asyncio.to_thread(shutdown_search_client)
+
+    async def _reap_sessions(self):
+        # 定期清理长时间未使用的会话
+        while True:
+            await asyncio.sleep(60)
+            now = time.monotonic()
+            for session_id, session in list(self.sessions.items()):
+                if not session.lock.locked() and now - session.last_used > settings.SERVER_SESSION_TTL:
+                    self.sessions.pop(session_id, None)
+
+    # --- 路由处理 ---
+
+    async def create_session(self, request: Request):
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = Session(self.system_prompt)
+        return JSONResponse({"session_id": session_id})
+
+    async def get_session(self, request: Request):
+        session = self.sessions.get(request.path_params["session_id"])
+        if session is None:
+            return JSONResponse({"error": "session not found"}, status_code=404)
+        return JSONResponse({
+            "messages": len(session.messages),
+            "busy": session.lock.locked(),
+            "idle_seconds": round(time.monotonic() - session.last_used, 1),
+        })
+
+    async def delete_session(self, request: Request):
+        self.sessions.pop(request.path_params["session_id"], None)
+        return JSONResponse({"deleted": True})
+
+    async def health(self, request: Request):
+        return JSONResponse({
+            "status": "ok" if self.agent_app is not None else "starting",
+            "sessions": len(self.sessions),
+            "running": self.admission.running,
+            "queued": self.admission.queued,
+            "max_running": self.admission.max_running,
+            "max_queued": self.admission.max_queued,
+            "llm_gateway": get_gateway("chat").stats(),
+        })
+
+    async def metrics(self, request: Request):
+        return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+    async def post_message(self, request: Request):
+        session = self.sessions.get(request.path_params["session_id"])
+        if session is None:
+            return JSONResponse({"error": "session not found"}, status_code=404)
+        try:
+            body = await request.json()
+            user_input = str(body["message"]).strip()
+        except (ValueError, KeyError, TypeError):
+            return JSONResponse({"error": "body must be JSON: {\"message\": \"...\"}"}, status_code=400)
+        if not user_input:
+            return JSONResponse({"error": "empty message"}, status_code=400)
+        if session.lock.locked():
+            return JSONResponse({"error": "session is busy with another message"}, status_code=409)
+        if not self.admission.try_reserve():
+            return JSONResponse({"error": "server is at capacity, retry later"}, status_code=429)
+        # 检查与占用之间没有其他 await：未上锁的 asyncio.Lock 会被立即获取，不会被并发请求插队
+        await session.lock.acquire()
+        reservation = Reservation(session, self.admission)
+
+        return EventSourceResponse(self._run(session, user_input, reservation), background=BackgroundTask(reservation.release))
+
+    async def _run(self, session: Session, user_input: str, reservation: Reservation):
+        try:
+            await reservation.start()
+            session.last_used = time.monotonic()
+            messages = session.messages + [HumanMessage(content=user_input)]
+            try:
+                async for event in astream_turn(self.agent_app, messages):
+                    if event["type"] == "done":
+                        state = event["state"]
+                        session.messages = state["messages"]
+                        yield {"event": "done", "data": json.dumps({"content": state["messages"][-1].content}, ensure_ascii=False)}
+                    else:
+                        yield {"event": event["type"], "data": json.dumps(event, ensure_ascii=False, default=str)}
+            except Exception as e:
+                yield {"event": "error", "data": json.dumps({"error": str(e)}, ensure_ascii=False)}
+        finally:
+            session.last_used = time.monotonic()
+            reservation.release()
+
+
+def create_app() -> Starlette:
+    server = DevMateServer()
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        await server.startup()
+        yield
+        await server.shutdown()
+
+    return Starlette(
+        routes=[
+            Route("/health", server.health, methods=["GET"]),
+            Route("/metrics", server.metrics, methods=["GET"]),
+            Route("/sessions", server.create_session, methods=["POST"]),
+            Route("/sessions/{session_id}", server.get_session, methods=["GET"]),
+            Route("/sessions/{session_id}", server.delete_session, methods=["DELETE"]),
+            Route("/sessions/{session_id}/messages", server.post_message, methods=["POST"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+if __name__ == "__main__":
+    uvicorn.run(create_app(), host=settings.SERVER_HOST, port=settings.SERVER_PORT)
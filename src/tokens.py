@@ -0,0 +1,15 @@
+import re
+
+# 轻量 token 估算
+# 不依赖 tiktoken 的 BPE 文件下载（内网环境不可用），按经验规则估算：
+# 中日韩字符约 1 token/字，其余文本约 4 字符/token。
+
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """估算一段文本的 token 数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
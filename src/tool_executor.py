@@ -0,0 +1,252 @@
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from langchain_core.messages import ToolMessage
+from langgraph.config import get_stream_writer
+from src.metrics import span
+
+# 并行工具执行节点
+# 替代 langgraph 的 ToolNode：同一条 AIMessage 中相互独立的 tool_calls 并发执行，
+# 结果按原始 tool_call 顺序返回，超时/异常只影响对应的那一个调用。
+# 超时按每个调用自己的开始时间计算（同步/异步两条路径一致）；
+# 同一文件的后续写入依赖前一个调用的结果，所以组内某个调用超时后，组内剩余调用不再执行。
+
+
+def _file_key(file_path: str) -> tuple:
+    # 与 write_file 的路径规则保持一致："main.py" 和 "output/main.py" 是同一个文件
+    path = file_path.strip().removeprefix("./")
+    if not path.startswith("output/"):
+        path = "output/" + path
+    return ("file", path)
+
+
+def _conflict_keys(call: dict) -> set:
+    """
+    写同一个文件的调用之间存在顺序依赖，必须串行执行；其余调用互不相关。
+    返回该调用会写入的文件键集合，空集表示可以独立并发。
+    """
+    args = call.get("args")
+    if not isinstance(args, dict):
+        return set()
+    keys = set()
+    if isinstance(args.get("file_path"), str):
+        keys.add(_file_key(args["file_path"]))
+    # write_files：一次调用写多个文件
+    for spec in args.get("files") or []:
+        if isinstance(spec, dict) and isinstance(spec.get("file_path"), str):
+            keys.add(_file_key(spec["file_path"]))
+    return keys
+
+
+def _get_writer():
+    """
+    获取 LangGraph 的 custom 流写入器，用于向调用方推送工具开始/结束事件。
+    不在图运行上下文中（例如直接调用节点）时返回空操作。
+    """
+    try:
+        return get_stream_writer()
+    except Exception:
+        return lambda event: None
+
+
+def _tool_start_event(call: dict) -> dict:
+    return {"type": "tool_start", "name": call["name"], "id": call["id"], "args": call["args"]}
+
+
+def _tool_end_event(message: ToolMessage, started: float) -> dict:
+    return {
+        "type": "tool_end",
+        "name": message.name,
+        "id": message.tool_call_id,
+        "status": message.status,
+        "duration": time.monotonic() - started,
+    }
+
+
+class ParallelToolNode:
+    def __init__(self, tools, max_concurrency: int = 8, timeout: float = 120.0):
+        self.tools_by_name = {t.name: t for t in tools}
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="tool")
+
+    def _run_one(self, call: dict) -> ToolMessage:
+        with span(f"tool.{call['name']}") as s:
+            message = self._invoke(call)
+            if message.status == "error":
+                s.fail()
+        return message
+
+    async def _arun_one(self, call: dict) -> ToolMessage:
+        with span(f"tool.{call['name']}") as s:
+            message = await self._ainvoke(call)
+            if message.status == "error":
+                s.fail()
+        return message
+
+    def _invoke(self, call: dict) -> ToolMessage:
+        tool = self.tools_by_name.get(call["name"])
+        if tool is None:
+            return ToolMessage(
+                content=f"Error: unknown tool '{call['name']}'. Available: {', '.join(self.tools_by_name)}",
+                name=call["name"],
+                tool_call_id=call["id"],
+                status="error"
+            )
+        try:
+            output = tool.invoke(call["args"])
+            return ToolMessage(content=str(output), name=call["name"], tool_call_id=call["id"])
+        except Exception as e:
+            return ToolMessage(
+                content=f"Error: {type(e).__name__}: {str(e)}\n Please fix your mistakes.",
+                name=call["name"],
+                tool_call_id=call["id"],
+                status="error"
+            )
+
+    async def _ainvoke(self, call: dict) -> ToolMessage:
+        tool = self.tools_by_name.get(call["name"])
+        if tool is None:
+            return self._invoke(call)
+        try:
+            output = await asyncio.wait_for(tool.ainvoke(call["args"]), timeout=self.timeout)
+            return ToolMessage(content=str(output), name=call["name"], tool_call_id=call["id"])
+        except asyncio.TimeoutError:
+            return self._timeout_message(call)
+        except Exception as e:
+            return ToolMessage(
+                content=f"Error: {type(e).__name__}: {str(e)}\n Please fix your mistakes.",
+                name=call["name"],
+                tool_call_id=call["id"],
+                status="error"
+            )
+
+    def _timeout_message(self, call: dict) -> ToolMessage:
+        # 线程无法被强制终止：超时的工具可能仍在后台执行完，提示模型先核对结果再重试
+        return ToolMessage(
+            content=(
+                f"Error: tool '{call['name']}' timed out after {self.timeout:g}s. "
+                f"It may still complete in the background; check its effect before retrying."
+            ),
+            name=call["name"],
+            tool_call_id=call["id"],
+            status="error",
+            # artifact 不会发送给模型，只用于标记超时，让组内剩余调用跳过
+            artifact={"timed_out": True}
+        )
+
+    @staticmethod
+    def _skipped_message(call: dict, timed_out: dict) -> ToolMessage:
+        return ToolMessage(
+            content=(
+                f"Error: tool '{call['name']}' was not run because an earlier call "
+                f"on the same file ('{timed_out['name']}') timed out."
+            ),
+            name=call["name"],
+            tool_call_id=call["id"],
+            status="error"
+        )
+
+    @staticmethod
+    def _group_calls(calls: list[dict]) -> list[list[dict]]:
+        # 按冲突键分组：写到同一文件的调用（含 write_files 间接相连的）合并为一组，组内保持原顺序
+        groups: list[list[tuple[int, dict]]] = []
+        owner: dict = {}
+        for index, call in enumerate(calls):
+            keys = _conflict_keys(call)
+            hits = sorted({owner[key] for key in keys if key in owner})
+            if hits:
+                target = hits[0]
+                for other in hits[1:]:
+                    groups[target].extend(groups[other])
+                    groups[other] = []
+                    for key, group_id in owner.items():
+                        if group_id == other:
+                            owner[key] = target
+            else:
+                target = len(groups)
+                groups.append([])
+            groups[target].append((index, call))
+            for key in keys:
+                owner[key] = target
+        return [[call for _, call in sorted(group, key=lambda item: item[0])] for group in groups if group]
+
+    def __call__(self, state) -> dict:
+        calls = state["messages"][-1].tool_calls
+
+        # 1. 分组
+        groups = self._group_calls(calls)
+
+        # 2. 每组同一时刻只有一个调用在途，完成后再提交组内下一个
+        # （复制 contextvars，保证工具能读到调用方设置的上下文）
+        writer = _get_writer()
+        by_id = {}
+        pending = {}  # future -> (组, 组内下标, 开始时间)
+
+        def _submit(group: list[dict], index: int):
+            call = group[index]
+            started = {}
+
+            def _task() -> ToolMessage:
+                # 超时从调用真正开始执行时计时，在线程池中排队的时间不计入
+                started["at"] = time.monotonic()
+                writer(_tool_start_event(call))
+                return self._run_one(call)
+
+            future = self._executor.submit(contextvars.copy_context().run, _task)
+            pending[future] = (group, index, started)
+
+        for group in groups:
+            _submit(group, 0)
+
+        # 3. 收集结果；超时的调用单独返回错误信息，不再阻塞本轮 Agent
+        while pending:
+            now = time.monotonic()
+            # 尚未开始的调用最早也要 now + timeout 才会超时，所以最多等待 timeout 后重新计算
+            remaining = [info[2]["at"] + self.timeout - now for info in pending.values() if "at" in info[2]]
+            done, _ = wait(list(pending), timeout=max(0.0, min(remaining + [self.timeout])), return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for future, (group, index, started) in list(pending.items()):
+                call = group[index]
+                if future in done:
+                    del pending[future]
+                    message = future.result()
+                    by_id[call["id"]] = message
+                    writer(_tool_end_event(message, started["at"]))
+                    if index + 1 < len(group):
+                        _submit(group, index + 1)
+                elif "at" in started and now - started["at"] >= self.timeout:
+                    del pending[future]
+                    future.cancel()
+                    by_id[call["id"]] = self._timeout_message(call)
+                    writer(_tool_end_event(by_id[call["id"]], started["at"]))
+                    for skipped in group[index + 1:]:
+                        by_id[skipped["id"]] = self._skipped_message(skipped, call)
+
+        # 4. 按原始 tool_call 顺序返回
+        return {"messages": [by_id[call["id"]] for call in calls]}
+
+    async def acall(self, state) -> dict:
+        """异步版本：在当前事件循环上并发执行，并发数受 max_concurrency 限制"""
+        calls = state["messages"][-1].tool_calls
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        writer = _get_writer()
+
+        async def _run_group(group: list[dict]) -> list[ToolMessage]:
+            async with semaphore:
+                messages = []
+                for index, call in enumerate(group):
+                    started = time.monotonic()
+                    writer(_tool_start_event(call))
+                    message = await self._arun_one(call)
+                    writer(_tool_end_event(message, started))
+                    messages.append(message)
+                    if isinstance(message.artifact, dict) and message.artifact.get("timed_out"):
+                        messages.extend(self._skipped_message(skipped, call) for skipped in group[index + 1:])
+                        break
+                return messages
+
+        results = await asyncio.gather(*[_run_group(group) for group in self._group_calls(calls)])
+        by_id = {message.tool_call_id: message for group in results for message in group}
+        return {"messages": [by_id[call["id"]] for call in calls]}
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# 离线单元测试：不访问网络，不依赖 .env 中的真实密钥
+# 运行（在项目根目录）：uv run --with pytest pytest tests
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.fakes import offline_env  # noqa: E402
+
+offline_env()
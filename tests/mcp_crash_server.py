@@ -0,0 +1,30 @@
+import os
+import asyncio
+from mcp.server.fastmcp import FastMCP
+
+# 测试用的 MCP 服务：可以按需崩溃或卡住，用于验证客户端的重启与超时处理
+
+mcp = FastMCP("devmate-test")
+
+
+@mcp.tool()
+def echo(text: str) -> str:
+    """返回 "进程号:文本"，用于判断会话是否换了新的子进程"""
+    return f"{os.getpid()}:{text}"
+
+
+@mcp.tool()
+def crash() -> str:
+    """模拟 server 在处理请求时崩溃"""
+    os._exit(1)
+
+
+@mcp.tool()
+async def hang() -> str:
+    """模拟卡住的 server"""
+    await asyncio.sleep(60)
+    return "late"
+
+
+if __name__ == "__main__":
+    mcp.run()
@@ -0,0 +1,58 @@
+from langchain_core.documents import Document
+from src import rag
+from src.config import settings
+from src.lexical_index import BM25Index
+
+QUERY = "变量配置"
+
+
+class _SpyStore:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = 0
+
+    def similarity_search(self, query, k=4):
+        self.queries += 1
+        return self.docs[:k]
+
+
+class _Span:
+    def set(self, **attrs):
+        self.attrs = attrs
+
+
+def _setup(monkeypatch):
+    """BM25 有 5 个命中；向量一路返回一个 BM25 没有的切片和 BM25 的第 2 名"""
+    lexical = BM25Index()
+    for i in range(5):
+        lexical.add(f"lex{i}", f"变量配置 第 {i} 节" + " 变量" * i, {"source": f"{i}.md", "chunk_hash": f"lex{i}"})
+    ranking = [cid for cid, _ in lexical.search(QUERY, 5)]
+    second = ranking[1]
+    store = _SpyStore([
+        Document(page_content="向量命中", metadata={"source": "v.md", "chunk_hash": "vec0"}, id="vec0"),
+        Document(page_content=lexical.docs[second]["text"], metadata=lexical.docs[second]["metadata"], id=second),
+    ])
+    monkeypatch.setattr(rag, "get_lexical_index", lambda: lexical)
+    monkeypatch.setattr(rag, "get_vectorstore", lambda: store)
+    return store, ranking
+
+
+def test_equal_weight_rrf_fuses_both_rankings(monkeypatch):
+    store, ranking = _setup(monkeypatch)
+    monkeypatch.setattr(settings, "RAG_HYBRID_RRF_K", 60)
+    monkeypatch.setattr(settings, "RAG_HYBRID_VECTOR_WEIGHT", 1.0)
+    span = _Span()
+    docs = rag._retrieve(QUERY, k=2, mode="hybrid", s=span)
+    assert store.queries == 1 and span.attrs["path"] == "hybrid"
+    # 两路都排第 2 的切片融合后排第 1
+    assert rag._chunk_key(docs[0]) == ranking[1]
+
+
+def test_vector_search_skipped_when_it_cannot_change_the_result(monkeypatch):
+    store, ranking = _setup(monkeypatch)
+    monkeypatch.setattr(settings, "RAG_HYBRID_RRF_K", 1)
+    monkeypatch.setattr(settings, "RAG_HYBRID_VECTOR_WEIGHT", 0.01)
+    span = _Span()
+    docs = rag._retrieve(QUERY, k=2, mode="hybrid", s=span)
+    assert store.queries == 0 and span.attrs["path"] == "lexical"
+    assert [doc.id for doc in docs] == ranking[:2]
@@ -0,0 +1,58 @@
+from src.lexical_index import BM25Index, exact_tokens, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_splits_identifiers_and_prefixes():
+    tokens = tokenize("dm_secret_user_count")
+    for token in ("dm_secret_user_count", "dm", "secret", "user", "count", "dm_", "dm_secret_", "dm_secret_user_"):
+        assert token in tokens
+
+
+def test_tokenize_uses_cjk_bigrams():
+    assert tokenize("变量命名") == ["变量", "量命", "命名"]
+    assert tokenize("变") == ["变"]
+
+
+def test_exact_tokens():
+    assert exact_tokens("`dm_secret_user_count` 是什么意思") == ["dm_secret_user_count"]
+    assert exact_tokens("happiness_level 字段") == ["happiness_level"]
+    assert exact_tokens("变量命名有什么要求？") == []
+
+
+def test_bm25_ranks_exact_identifier_first():
+    index = BM25Index()
+    index.add("rules", "所有全局变量必须以 dm_secret_ 开头", {"source": "rules.md"})
+    index.add("deploy", "部署说明：变量配置与接口响应格式", {"source": "deploy.md"})
+    index.add("cache", "缓存说明：变量配置", {"source": "cache.md"})
+    hits = index.search("dm_secret_ 变量", k=3)
+    assert hits[0][0] == "rules"
+    assert [cid for cid, _ in index.search("变量", k=3, required=["dm_secret_"])] == ["rules"]
+
+
+def test_bm25_remove_and_reload(tmp_path):
+    index = BM25Index()
+    index.add("a", "happiness_level max", {})
+    index.add("b", "other text", {})
+    index.remove("a")
+    assert not index.contains("happiness_level")
+    path = str(tmp_path / "index.json")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert len(loaded) == 1 and loaded.search("other", k=1)[0][0] == "b"
+
+
+def test_rrf_equal_weights_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"]])
+    # b 在两路中都靠前，得分最高
+    assert fused[0] == "b"
+    assert set(fused) == {"a", "b", "c"}
+
+
+def test_rrf_is_symmetric_with_equal_weights():
+    assert reciprocal_rank_fusion([["x"], ["y"]])[:2] == ["x", "y"]
+    assert reciprocal_rank_fusion([["x", "y"], ["y", "x"]], k=60) in (["x", "y"], ["y", "x"])
+
+
+def test_rrf_weights_shift_the_ranking():
+    rankings = [["vec"], ["lex"]]
+    assert reciprocal_rank_fusion(rankings, weights=[1.0, 2.0])[0] == "lex"
+    assert reciprocal_rank_fusion(rankings, weights=[2.0, 1.0])[0] == "vec"
@@ -0,0 +1,82 @@
+import asyncio
+from src.llm_gateway import AdaptiveLimiter, LLMGateway
+
+
+class _Throttled(Exception):
+    status_code = 429
+
+
+def test_async_waiters_are_served_in_arrival_order():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=1, max_limit=1)
+        await limiter.acquire_async()
+        order = []
+
+        async def worker(name):
+            await limiter.acquire_async()
+            order.append(name)
+            limiter.release()
+
+        tasks = []
+        for name in range(5):
+            tasks.append(asyncio.create_task(worker(name)))
+            await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order, limiter
+
+    order, limiter = asyncio.run(scenario())
+    assert order == [0, 1, 2, 3, 4]
+    assert limiter.in_flight == 0
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=1, max_limit=1)
+        await limiter.acquire_async()
+        waiter = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0)
+        # 释放槽位（移交给等待者）后立即取消它
+        limiter.release()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        await asyncio.sleep(0)
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.in_flight == 0
+    assert not limiter._waiters
+
+
+def test_aimd_halves_on_overload_and_grows_on_success():
+    limiter = AdaptiveLimiter(initial=8, max_limit=8)
+    limiter.on_overload()
+    assert limiter.limit == 4
+    for _ in range(10):
+        limiter.on_overload()
+    assert limiter.limit == 1
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 8
+
+
+def test_gateway_starts_at_configured_concurrency():
+    gateway = LLMGateway("chat", rpm=0, tpm=0, max_concurrency=6, max_retries=0)
+    assert gateway.limiter.limit == 6
+
+
+def test_acall_retries_throttled_calls(monkeypatch):
+    gateway = LLMGateway("chat", rpm=0, tpm=0, max_concurrency=4, max_retries=2)
+    monkeypatch.setattr(gateway, "_backoff", lambda attempt, error: 0.0)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _Throttled()
+        return "ok"
+
+    assert asyncio.run(gateway.acall(flaky)) == "ok"
+    assert len(attempts) == 3
+    assert gateway.limiter.limit < 4
+    assert gateway.limiter.in_flight == 0
@@ -0,0 +1,51 @@
+import os
+import time
+import signal
+import pytest
+from mcp import McpError
+from src.config import settings
+from src.mcp_client import MCPSearchClient
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "MCP_SERVER_SCRIPT", os.path.join("tests", "mcp_crash_server.py"))
+    client = MCPSearchClient(pool_size=1, call_timeout=5)
+    yield client
+    client.close()
+
+
+def _pid(reply: str) -> int:
+    return int(reply.split(":", 1)[0])
+
+
+def test_reuses_session_between_calls(client):
+    assert _pid(client.call_tool("echo", {"text": "a"})) == _pid(client.call_tool("echo", {"text": "b"}))
+
+
+def test_restarts_after_server_crashes_mid_call(client):
+    first = _pid(client.call_tool("echo", {"text": "a"}))
+    # 崩溃的调用重启后重试一次，重试时再次崩溃，最终以 CONNECTION_CLOSED 报错
+    with pytest.raises(McpError):
+        client.call_tool("crash", {})
+    assert _pid(client.call_tool("echo", {"text": "b"})) != first
+
+
+def test_restarts_after_idle_server_dies(client):
+    first = _pid(client.call_tool("echo", {"text": "a"}))
+    os.kill(first, signal.SIGKILL)
+    time.sleep(0.5)
+    reply = client.call_tool("echo", {"text": "b"})
+    assert reply.endswith(":b") and _pid(reply) != first
+
+
+def test_timeout_is_raised_once_and_session_recovers(client):
+    client.call_tool("echo", {"text": "a"})
+    client.call_timeout = 1
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        client.call_tool("hang", {})
+    # 超时不重试：只等待一个超时周期
+    assert time.monotonic() - started < 2
+    client.call_timeout = 5
+    assert client.call_tool("echo", {"text": "b"}).endswith(":b")
@@ -0,0 +1,80 @@
+import os
+import json
+import numpy as np
+import pytest
+from benchmarks.fakes import FakeEmbeddings
+from src.numpy_store import CURRENT_FILE, METADATA_FILE, VECTORS_FILE, NumpyVectorStore
+
+TEXTS = ["全局变量必须以 dm_secret_ 开头", "响应体必须包含 happiness_level", "commit 末尾加 DevMate Rocks!"]
+
+
+@pytest.fixture
+def embeddings():
+    return FakeEmbeddings()
+
+
+def _ingest(store, embeddings, ids, texts):
+    store.upsert(ids, embeddings.embed_documents(texts), texts, [{"source": f"{i}.md"} for i in ids])
+    store.flush()
+
+
+def test_round_trip_and_search(tmp_path, embeddings):
+    store = NumpyVectorStore(str(tmp_path), embeddings)
+    _ingest(store, embeddings, ["a", "b", "c"], TEXTS)
+
+    reopened = NumpyVectorStore(str(tmp_path), embeddings)
+    assert len(reopened) == 3
+    assert reopened.get()["documents"] == TEXTS
+    top = reopened.similarity_search(TEXTS[1], k=1)[0]
+    assert top.id == "b" and top.metadata == {"source": "b.md"}
+
+
+def test_delete_and_update_metadata(tmp_path, embeddings):
+    store = NumpyVectorStore(str(tmp_path), embeddings)
+    _ingest(store, embeddings, ["a", "b", "c"], TEXTS)
+    store.delete(["a"])
+    store.update_metadata(["b"], [{"source": "b.md", "start_index": 10}])
+    store.flush()
+
+    reopened = NumpyVectorStore(str(tmp_path), embeddings)
+    data = reopened.get()
+    assert data["ids"] == ["b", "c"]
+    assert data["metadatas"][0]["start_index"] == 10
+
+
+def test_flush_switches_generations_through_the_pointer(tmp_path, embeddings):
+    store = NumpyVectorStore(str(tmp_path), embeddings)
+    for i in range(3):
+        _ingest(store, embeddings, [f"id{i}"], [TEXTS[i]])
+    with open(tmp_path / CURRENT_FILE, encoding="utf-8") as f:
+        generation = int(f.read())
+    # 只保留当前与上一个版本
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith("vectors-")) == [
+        f"vectors-{generation - 1}", f"vectors-{generation}"
+    ]
+
+
+def test_unpublished_generation_is_ignored(tmp_path, embeddings):
+    # 模拟 flush 在切换指针前崩溃：新版本目录已写好一半，读方仍加载旧版本
+    store = NumpyVectorStore(str(tmp_path), embeddings)
+    _ingest(store, embeddings, ["a", "b"], TEXTS[:2])
+    orphan = tmp_path / "vectors-99"
+    orphan.mkdir()
+    np.save(orphan / VECTORS_FILE, np.zeros((5, 4), dtype=np.float32))
+
+    reopened = NumpyVectorStore(str(tmp_path), embeddings)
+    assert reopened.get()["ids"] == ["a", "b"]
+
+
+def test_loads_legacy_flat_layout(tmp_path, embeddings):
+    vectors = np.asarray(embeddings.embed_documents(TEXTS[:1]), dtype=np.float32)
+    np.save(tmp_path / VECTORS_FILE, vectors)
+    with open(tmp_path / METADATA_FILE, "w", encoding="utf-8") as f:
+        json.dump({"ids": ["a"], "documents": TEXTS[:1], "metadatas": [{}]}, f)
+
+    store = NumpyVectorStore(str(tmp_path), embeddings)
+    assert store.get()["ids"] == ["a"]
+    # 下一次 flush 切换到版本目录并清理旧布局
+    _ingest(store, embeddings, ["b"], TEXTS[1:2])
+    assert not (tmp_path / VECTORS_FILE).exists()
+    assert NumpyVectorStore(str(tmp_path), embeddings).get()["ids"] == ["a", "b"]
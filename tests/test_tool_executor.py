@@ -0,0 +1,67 @@
+import time
+import asyncio
+from types import SimpleNamespace
+from langchain_core.tools import tool
+from src.tool_executor import ParallelToolNode
+
+
+@tool
+def sleep_for(seconds: float, file_path: str = "") -> str:
+    """等待指定秒数后返回"""
+    time.sleep(seconds)
+    return f"slept {seconds}"
+
+
+def _state(*calls):
+    tool_calls = [
+        {"name": "sleep_for", "id": call_id, "args": args}
+        for call_id, args in calls
+    ]
+    return {"messages": [SimpleNamespace(tool_calls=tool_calls)]}
+
+
+def _by_id(result):
+    return {message.tool_call_id: message for message in result["messages"]}
+
+
+def test_results_keep_original_order():
+    node = ParallelToolNode([sleep_for], max_concurrency=4, timeout=5)
+    state = _state(("a", {"seconds": 0.2}), ("b", {"seconds": 0.0}), ("c", {"seconds": 0.1}))
+    assert [m.tool_call_id for m in node(state)["messages"]] == ["a", "b", "c"]
+
+
+def test_queued_calls_do_not_use_up_their_timeout():
+    # 只有一个工作线程：三个各 0.3s 的调用串行执行，总耗时超过 timeout，但每个调用都在自己的超时内
+    node = ParallelToolNode([sleep_for], max_concurrency=1, timeout=0.5)
+    state = _state(("a", {"seconds": 0.3}), ("b", {"seconds": 0.3}), ("c", {"seconds": 0.3}))
+    messages = _by_id(node(state))
+    assert all(message.status == "success" for message in messages.values())
+
+
+def test_timeout_only_affects_its_own_group():
+    node = ParallelToolNode([sleep_for], max_concurrency=4, timeout=0.3)
+    state = _state(
+        ("slow", {"seconds": 1.0, "file_path": "main.py"}),
+        ("after", {"seconds": 0.0, "file_path": "main.py"}),
+        ("other", {"seconds": 0.0, "file_path": "other.py"}),
+    )
+    started = time.monotonic()
+    messages = _by_id(node(state))
+    assert time.monotonic() - started < 0.9
+    assert "timed out" in messages["slow"].content and "background" in messages["slow"].content
+    # 同一文件的后续写入不执行，避免与仍在后台运行的调用竞争
+    assert messages["after"].status == "error" and "was not run" in messages["after"].content
+    assert messages["other"].status == "success"
+
+
+def test_async_path_matches_sync_timeouts():
+    node = ParallelToolNode([sleep_for], max_concurrency=4, timeout=0.3)
+    state = _state(
+        ("slow", {"seconds": 1.0, "file_path": "main.py"}),
+        ("after", {"seconds": 0.0, "file_path": "main.py"}),
+        ("other", {"seconds": 0.0, "file_path": "other.py"}),
+    )
+    messages = _by_id(asyncio.run(node.acall(state)))
+    assert "timed out" in messages["slow"].content
+    assert "was not run" in messages["after"].content
+    assert messages["other"].status == "success"